@@ -32,6 +32,14 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_pre_ping": True,
 }
 
+# Request profiling (disabled unless PROFILE_SECRET or PROFILE_SAMPLE_RATE is set)
+app.config["PROFILE_SECRET"] = os.environ.get("PROFILE_SECRET")
+app.config["PROFILE_SAMPLE_RATE"] = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+app.config["PROFILE_SLOW_MS"] = float(os.environ.get("PROFILE_SLOW_MS", 500))
+app.config["PROFILE_DIR"] = os.environ.get("PROFILE_DIR", "profiles")
+app.config["PROFILE_MAX_FILES"] = int(os.environ.get("PROFILE_MAX_FILES", 50))
+app.config["PROFILE_MAX_BYTES"] = int(os.environ.get("PROFILE_MAX_BYTES", 50 * 1024 * 1024))
+
 # Initialize the app with the extension
 db.init_app(app)
 
@@ -39,6 +47,7 @@ with app.app_context():
     # Import models to create tables
     import models
     db.create_all()
+    models.Store.ensure_default()
 
 # Import utility functions for templates
 from utils import format_currency, format_percentage, format_number
@@ -50,5 +59,13 @@ app.jinja_env.globals.update(
     format_number=format_number
 )
 
+# Resolve the current store for every request
+from stores import init_stores
+init_stores(app)
+
+# Register request profiling hooks
+from profiler import init_profiler
+init_profiler(app)
+
 # Import routes after app creation to avoid circular imports
 from routes import *
@@ -0,0 +1,55 @@
+"""
+Archive closed bundles (sold out or older than a cutoff) into bundles_archive.
+
+Runs in small batches, committing after each one, so it can be scheduled as a
+background job without holding long locks on the bundles table:
+
+    python archive_bundles.py --older-than-days 365 --batch-size 500
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+from app import app
+from data_service import DataService
+
+
+def archive_closed_bundles(older_than_days, batch_size, pause):
+    """Archive batches until no closed bundles remain in the hot table"""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    total = 0
+
+    while True:
+        archived = DataService.archive_bundle_batch(cutoff, batch_size)
+        if not archived:
+            break
+
+        total += archived
+        print(f"Archived {archived} bundles ({total} total)")
+
+        if pause:
+            time.sleep(pause)
+
+    return total
+
+def main():
+    """Main archive function"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--older-than-days', type=int, default=365,
+                        help='Archive bundles created more than this many days ago (default: 365)')
+    parser.add_argument('--batch-size', type=int, default=500,
+                        help='Bundles moved per transaction (default: 500)')
+    parser.add_argument('--pause', type=float, default=0.0,
+                        help='Seconds to sleep between batches (default: 0)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        total = archive_closed_bundles(args.older_than_days, args.batch_size, args.pause)
+        print(f"Archive completed: {total} bundles moved to history")
+
+        conflicts = DataService.get_archive_id_conflicts()
+        if conflicts:
+            print(f"Skipped {len(conflicts)} bundles whose ID is already archived: {conflicts}")
+            print("Their IDs were reused before migrate_bundle_ids.py ran; resolve them by hand")
+
+if __name__ == '__main__':
+    main()
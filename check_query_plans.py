@@ -0,0 +1,241 @@
+"""
+Query plan regression check for the DataService read paths.
+
+Seeds a realistic number of rows inside a transaction that is rolled back at
+the end, runs each DataService query while capturing the SQL it emits, and
+asks the database for the plan of every captured statement. Exits with status
+1 if a hot-path query falls back to a full table scan or an explicit sort.
+Queries that are meant to read a whole (small or streamed) table say so in
+CHECKS and may scan and sort that table.
+
+Supports SQLite (EXPLAIN QUERY PLAN) and PostgreSQL (EXPLAIN FORMAT JSON):
+
+    DATABASE_URL=postgresql://... python check_query_plans.py --rows 20000
+"""
+import argparse
+import json
+import re
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import delete, event, insert
+from app import app, db
+from data_service import DataService
+from models import DEFAULT_STORE_ID, ArchivedBundle, Bundle, BundleChange, Config, SalesRollup
+
+QUALITIES = ('premium', 'regular', 'economica', 'rechazo')
+
+# Seeded bundles are spread over this many stores, so store-scoped indexes are selective
+SEED_STORES = 10
+
+# (name, callable, tables the query is expected to read in full). A full read
+# may be planned as a scan plus a sort; anything else must use an index.
+CHECKS = [
+    ('get_bundle_list', lambda ids: DataService.get_bundle_list(), set()),
+    ('get_bundle_list_page', lambda ids: DataService.get_bundle_list(
+        before=DataService.get_bundle_list(limit=1)[1]
+    ), set()),
+    # One rollup row per store
+    ('get_store_summary', lambda ids: DataService.get_store_summary(), {'store_rollups'}),
+    ('get_bundle', lambda ids: DataService.get_bundle(ids[len(ids) // 2]), set()),
+    ('get_missing_bundle_ids', lambda ids: DataService.get_missing_bundle_ids(ids[:50]), set()),
+    ('get_sales_summary', lambda ids: DataService.get_sales_summary(ids[len(ids) // 2]), set()),
+    ('get_archived_bundles', lambda ids: DataService.get_archived_bundles(), set()),
+    ('get_archived_bundles_page', lambda ids: DataService.get_archived_bundles(
+        before=DataService.get_archived_bundles(limit=1)[1]
+    ), set()),
+    ('get_archived_bundle', lambda ids: DataService.get_archived_bundle(ids[0]), set()),
+    # The CSV export streams the whole archive of the store
+    ('iter_archived_bundles', lambda ids: list(DataService.iter_archived_bundles()), {'bundles_archive'}),
+    ('get_bundle_history', lambda ids: DataService.get_bundle_history(ids[0]), set()),
+    ('get_bundle_history_page', lambda ids: DataService.get_bundle_history(ids[0], before=10 ** 9), set()),
+    # The config table only ever holds a handful of keys
+    ('get_config', lambda ids: DataService.get_config(), {'config'}),
+    ('find_config_keys', lambda ids: Config.query.filter(
+        Config.store_id == DEFAULT_STORE_ID, Config.key.in_(['profit_percentages'])
+    ).all(), {'config'}),
+    ('find_bundle_by_name', lambda ids: Bundle.query.filter_by(store_id=DEFAULT_STORE_ID, name=f'Paca {ids[0]}').first(), set()),
+]
+
+
+def seed(rows):
+    """Insert rows bundles over SEED_STORES stores, their rollups and an archived tail.
+
+    Returns the live bundle IDs of the default store, which the checks query.
+    """
+    start = datetime.utcnow() - timedelta(days=rows)
+    classification = json.dumps({
+        'by_type': {'hombre': 100, 'mujer': 100, 'ninos': 0, 'hogar': 0},
+        'by_quality': {'premium': 50, 'regular': 50, 'economica': 50, 'rechazo': 50}
+    })
+    expenses = json.dumps({'transport': 10, 'cleaning': 5, 'other': 0})
+
+    bundles = [
+        {
+            'store_id': DEFAULT_STORE_ID + i % SEED_STORES,
+            'name': f'Paca {i}',
+            'total_cost': 1000.0,
+            'total_pieces': 200,
+            'additional_expenses': expenses,
+            'classification': classification,
+            'created_at': start + timedelta(days=i),
+            'updated_at': start + timedelta(days=i)
+        }
+        for i in range(rows)
+    ]
+    db.session.execute(insert(Bundle), bundles)
+
+    seeded = db.session.execute(db.select(Bundle.id, Bundle.store_id).order_by(Bundle.id)).all()
+    bundle_ids = [bundle_id for bundle_id, _ in seeded]
+
+    db.session.execute(insert(SalesRollup), [
+        {'bundle_id': bundle_id, 'quality': quality, 'pieces_sold': 10, 'revenue': 100.0}
+        for bundle_id in bundle_ids[::2]
+        for quality in QUALITIES
+    ])
+
+    # Archive a quarter of the seeded bundles so the cold table has data too
+    archived_ids = bundle_ids[:rows // 4]
+    db.session.execute(insert(ArchivedBundle), [
+        dict(bundle, id=bundle_id, archived_at=bundle['created_at'] + timedelta(days=365))
+        for bundle_id, bundle in zip(archived_ids, bundles)
+    ])
+    db.session.execute(delete(Bundle).where(Bundle.id.in_(archived_ids)))
+
+    db.session.execute(insert(BundleChange), [
+        {'bundle_id': bundle_id, 'store_id': store_id, 'action': 'update',
+         'field': field, 'old_value': '1', 'new_value': '2'}
+        for bundle_id, store_id in seeded
+        for field in ('name', 'total_cost', 'total_pieces')
+    ])
+
+    return [
+        bundle_id for bundle_id, store_id in seeded[rows // 4:]
+        if store_id == DEFAULT_STORE_ID
+    ]
+
+def analyze(connection):
+    """Refresh planner statistics so plans reflect the seeded data"""
+    connection.exec_driver_sql('ANALYZE')
+
+def capture_statements(connection, fn):
+    """Run fn and return the (statement, parameters) pairs it sent to the database"""
+    captured = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(connection, 'before_cursor_execute', record)
+    try:
+        fn()
+    finally:
+        event.remove(connection, 'before_cursor_execute', record)
+
+    return captured
+
+def sqlite_problems(connection, statement, parameters, allowed_scans):
+    """Return plan lines showing a full scan or temp-b-tree sort"""
+    plan = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    problems = []
+    full_read = False
+
+    for row in plan:
+        detail = row[-1]
+        scan = re.match(r'SCAN (\w+)', detail)
+        if scan and 'USING' not in detail:
+            if scan.group(1) in allowed_scans:
+                full_read = True
+            else:
+                problems.append(detail)
+        if 'USE TEMP B-TREE' in detail and not full_read:
+            problems.append(detail)
+
+    return problems
+
+def postgresql_problems(connection, statement, parameters, allowed_scans):
+    """Return plan nodes showing a sequential scan or sort"""
+    plan = connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {statement}', parameters).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    problems = []
+
+    def full_read_tables(node):
+        """Tables read anywhere under node"""
+        tables = {node['Relation Name']} if 'Relation Name' in node else set()
+        for child in node.get('Plans', []):
+            tables |= full_read_tables(child)
+        return tables
+
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        node_type = node['Node Type']
+        if node_type == 'Seq Scan' and node.get('Relation Name') not in allowed_scans:
+            problems.append(f"Seq Scan on {node.get('Relation Name')}")
+        if node_type in ('Sort', 'Incremental Sort'):
+            # Sorting is expected when the query reads allowed tables in full anyway
+            scanned = full_read_tables(node)
+            if not scanned or not scanned <= allowed_scans:
+                problems.append(f"{node_type} on {', '.join(node.get('Sort Key', []))}")
+        nodes.extend(node.get('Plans', []))
+
+    return problems
+
+def check_query_plans(rows):
+    """Run every check and return the number of failing queries"""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        plan_problems = sqlite_problems
+    elif dialect == 'postgresql':
+        plan_problems = postgresql_problems
+    else:
+        raise SystemExit(f"Unsupported database dialect: {dialect}")
+
+    failures = 0
+
+    try:
+        bundle_ids = seed(rows)
+        db.session.flush()
+        connection = db.session.connection()
+        analyze(connection)
+
+        for name, fn, allowed_scans in CHECKS:
+            db.session.expunge_all()
+            statements = capture_statements(connection, lambda: fn(bundle_ids))
+
+            problems = []
+            for statement, parameters in statements:
+                problems.extend(plan_problems(connection, statement, parameters, allowed_scans))
+
+            if not statements:
+                print(f"WARN {name}: no SQL captured")
+            elif problems:
+                failures += 1
+                print(f"FAIL {name}")
+                for problem in problems:
+                    print(f"     {problem}")
+            else:
+                print(f"ok   {name}")
+    finally:
+        db.session.rollback()
+
+    return failures
+
+def main():
+    """Main check function"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000,
+                        help='Bundles to seed before explaining (default: 20000)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        failures = check_query_plans(args.rows)
+
+    if failures:
+        print(f"{failures} queries have full scans or sorts in their plan")
+        sys.exit(1)
+
+    print("All query plans use indexes or expected full reads")
+
+if __name__ == '__main__':
+    main()
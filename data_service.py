@@ -1,45 +1,380 @@
-from models import Bundle, Config, db
+from models import (
+    ArchivedBundle, Bundle, BundleChange, Config, Sale, SalesRollup, Store, StoreRollup, db,
+    parse_additional_expenses, parse_classification
+)
+from stores import current_store_id, invalidate_stores
+from utils import calculate_cost_per_piece
+from collections import namedtuple
 from datetime import datetime
+from sqlalchemy import delete, exists, func, insert, literal, or_, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+import copy
+import json
 import logging
+import time
+
+QUALITIES = ('premium', 'regular', 'economica', 'rechazo')
+
+HISTORY_PAGE_SIZE = 50
+BUNDLE_PAGE_SIZE = 50
+ARCHIVE_PAGE_SIZE = 50
+
+# Seconds a process serves a store's config from memory
+CONFIG_CACHE_TTL = 30
+
+_config_cache = {}
+
+# Lightweight read models for list, summary and export views
+BundleListRow = namedtuple('BundleListRow', ['id', 'name', 'total_cost', 'total_pieces', 'cost_per_piece', 'created_at'])
+ArchivedBundleRow = namedtuple('ArchivedBundleRow', ['id', 'name', 'total_cost', 'total_pieces', 'created_at', 'archived_at'])
+BundleChangeRow = namedtuple('BundleChangeRow', ['id', 'action', 'field', 'old_value', 'new_value', 'changed_at'])
+ArchivedExportRow = namedtuple('ArchivedExportRow', [
+    'id', 'name', 'total_cost', 'total_pieces', 'total_additional_expenses', 'by_quality', 'created_at', 'archived_at'
+])
+
+
+def _dialect_insert(model):
+    """Build an INSERT supporting ON CONFLICT for the current database"""
+    dialect = db.session.get_bind().dialect.name
+    return (postgresql.insert if dialect == 'postgresql' else sqlite.insert)(model)
+
+def _upsert_sales_rollups(totals):
+    """Add per-(bundle, quality) sale totals to the rollup table in one statement"""
+    stmt = _dialect_insert(SalesRollup).values([
+        {
+            'bundle_id': bundle_id,
+            'quality': quality,
+            'pieces_sold': pieces,
+            'revenue': revenue,
+            'updated_at': datetime.utcnow()
+        }
+        for (bundle_id, quality), (pieces, revenue) in totals.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['bundle_id', 'quality'],
+        set_={
+            'pieces_sold': SalesRollup.pieces_sold + stmt.excluded.pieces_sold,
+            'revenue': SalesRollup.revenue + stmt.excluded.revenue,
+            'updated_at': stmt.excluded.updated_at
+        }
+    )
+    db.session.execute(stmt)
+
+def _oversold_rollups(totals):
+    """List the (bundle, quality) rollups that sell more pieces than the bundle has"""
+    bundle_ids = {bundle_id for bundle_id, _ in totals}
+    
+    pieces_by_quality = {
+        bundle_id: parse_classification(classification).get('by_quality', {})
+        for bundle_id, classification in db.session.execute(
+            db.select(Bundle.id, Bundle.classification).where(Bundle.id.in_(bundle_ids))
+            .union_all(
+                db.select(ArchivedBundle.id, ArchivedBundle.classification).where(ArchivedBundle.id.in_(bundle_ids))
+            )
+        )
+    }
+    
+    oversold = []
+    rollups = db.session.execute(
+        db.select(SalesRollup.bundle_id, SalesRollup.quality, SalesRollup.pieces_sold)
+        .where(SalesRollup.bundle_id.in_(bundle_ids))
+    )
+    for bundle_id, quality, pieces_sold in rollups:
+        if (bundle_id, quality) not in totals:
+            continue
+        pieces = pieces_by_quality.get(bundle_id, {}).get(quality, 0)
+        if pieces_sold > pieces:
+            oversold.append({'bundle_id': bundle_id, 'quality': quality, 'pieces': pieces, 'pieces_sold': pieces_sold})
+    
+    return sorted(oversold, key=lambda item: (item['bundle_id'], item['quality']))
+
+def _store_rollup_delta(total_cost, total_additional_expenses, total_pieces, by_quality, sign=1):
+    """Contribution of one bundle to its store rollup (sign=-1 to remove it)"""
+    cost_per_piece = calculate_cost_per_piece(total_cost, total_additional_expenses, total_pieces)
+    
+    delta = {
+        'bundle_count': sign,
+        'total_cost': sign * total_cost,
+        'total_additional_expenses': sign * total_additional_expenses
+    }
+    for quality in QUALITIES:
+        delta[f'{quality}_basis'] = sign * cost_per_piece * max(by_quality.get(quality, 0), 0)
+    
+    return delta
+
+def _bundle_rollup_delta(bundle, sign=1):
+    """Store rollup contribution of a Bundle instance"""
+    return _store_rollup_delta(
+        bundle.total_cost,
+        sum(bundle.get_additional_expenses().values()),
+        bundle.total_pieces,
+        bundle.get_classification().get('by_quality', {}),
+        sign
+    )
+
+def _merge_deltas(*deltas):
+    """Add store rollup deltas column by column"""
+    merged = {}
+    for delta in deltas:
+        for column, value in delta.items():
+            merged[column] = merged.get(column, 0) + value
+    return merged
+
+def _apply_store_rollup(store_id, delta):
+    """Add a delta to a store rollup row with one atomic upsert"""
+    stmt = _dialect_insert(StoreRollup).values(store_id=store_id, updated_at=datetime.utcnow(), **delta)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['store_id'],
+        set_=dict(
+            {column: getattr(StoreRollup, column) + stmt.excluded[column] for column in delta},
+            updated_at=stmt.excluded.updated_at
+        )
+    )
+    db.session.execute(stmt)
+
+def _apply_bundle_data(bundle, bundle_data):
+    """Copy validated bundle data onto a Bundle instance"""
+    bundle.name = bundle_data['name']
+    bundle.total_cost = bundle_data['total_cost']
+    bundle.total_pieces = bundle_data['total_pieces']
+    bundle.set_additional_expenses(bundle_data['additional_expenses'])
+    bundle.set_classification(bundle_data['classification'])
+
+def _bundle_snapshot(bundle):
+    """Flatten a bundle's editable fields for field-level diffs and create/delete snapshots"""
+    snapshot = {
+        'name': bundle.name,
+        'total_cost': bundle.total_cost,
+        'total_pieces': bundle.total_pieces
+    }
+    for key, value in bundle.get_additional_expenses().items():
+        snapshot[f'additional_expenses.{key}'] = value
+    
+    classification = bundle.get_classification()
+    for group in ('by_type', 'by_quality'):
+        for key, value in classification.get(group, {}).items():
+            snapshot[f'classification.{group}.{key}'] = value
+    
+    return snapshot
+
+
+def _decode_snapshot(value):
+    """Parse a JSON snapshot, or None for empty and legacy values"""
+    try:
+        snapshot = json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return None
+    return snapshot if isinstance(snapshot, dict) else None
+
+def _change_row(change_id, action, field, old_value, new_value, changed_at):
+    """Build a BundleChangeRow; whole-bundle rows carry decoded snapshots instead of text"""
+    if field is None:
+        old_value = _decode_snapshot(old_value)
+        new_value = _decode_snapshot(new_value)
+    return BundleChangeRow(change_id, action, field, old_value, new_value, changed_at)
+
+
+class _ChangeLog:
+    """Buffers bundle changes during a write and inserts them with one bulk statement"""
+    
+    def __init__(self):
+        self.entries = []
+    
+    def record(self, bundle, store_id, action, old=None, new=None):
+        """Buffer a change; bundle may be a Bundle not yet flushed or a bundle ID"""
+        self.entries.append((bundle, store_id, action, old or {}, new or {}))
+    
+    def flush(self):
+        """Write the buffered changes as part of the current transaction"""
+        if not self.entries:
+            return
+        
+        # New bundles need their IDs before their history rows can reference them
+        db.session.flush()
+        
+        now = datetime.utcnow()
+        rows = []
+        for bundle, store_id, action, old, new in self.entries:
+            bundle_id = bundle if isinstance(bundle, int) else bundle.id
+            
+            # Creates, deletes and archives are one row each, with the whole snapshot if any
+            if action != 'update':
+                rows.append({
+                    'bundle_id': bundle_id,
+                    'store_id': store_id,
+                    'action': action,
+                    'field': None,
+                    'old_value': json.dumps(old) if old else None,
+                    'new_value': json.dumps(new) if new else None,
+                    'changed_at': now
+                })
+                continue
+            
+            fields = sorted(field for field in set(old) | set(new) if old.get(field) != new.get(field))
+            for field in fields:
+                rows.append({
+                    'bundle_id': bundle_id,
+                    'store_id': store_id,
+                    'action': action,
+                    'field': field,
+                    'old_value': None if old.get(field) is None else str(old[field]),
+                    'new_value': None if new.get(field) is None else str(new[field]),
+                    'changed_at': now
+                })
+        
+        if rows:
+            db.session.execute(insert(BundleChange), rows)
+        self.entries = []
+
+def _archived_id_exists():
+    """Condition: the live bundle's ID is already used by an archived bundle.
+    
+    Only possible if the ID was reused before migrate_bundle_ids.py ran.
+    """
+    return exists().where(ArchivedBundle.id == Bundle.id)
+
+def _get_store_bundle(bundle_id):
+    """Load a bundle only if it belongs to the current store"""
+    return Bundle.query.filter_by(id=bundle_id, store_id=current_store_id()).first()
 
 
 class DataService:
     """Service class to handle data operations with PostgreSQL database"""
     
     @staticmethod
-    def get_all_bundles():
-        """Get all bundles ordered by creation date (newest first)"""
+    def get_bundle_list(before=None, limit=BUNDLE_PAGE_SIZE):
+        """Get one page of the dashboard list, newest first.
+        
+        Returns (bundles, next_before); pass next_before back as before to
+        get the following page, or stop when it is None.
+        """
         try:
-            bundles = Bundle.query.order_by(Bundle.created_at.desc()).all()
-            return [bundle.to_dict() for bundle in bundles]
+            store_id = current_store_id()
+            stmt = (
+                db.select(
+                    Bundle.id, Bundle.name, Bundle.total_cost, Bundle.total_pieces,
+                    Bundle.additional_expenses, Bundle.created_at
+                )
+                .where(Bundle.store_id == store_id)
+                .order_by(Bundle.created_at.desc(), Bundle.id.desc())
+                .limit(limit + 1)
+            )
+            if before is not None:
+                cursor = db.session.execute(
+                    db.select(Bundle.created_at, Bundle.id)
+                    .where(Bundle.id == before, Bundle.store_id == store_id)
+                ).first()
+                if cursor is None:
+                    return [], None
+                stmt = stmt.where(tuple_(Bundle.created_at, Bundle.id) < tuple(cursor))
+            
+            bundles = [
+                BundleListRow(
+                    bundle_id, name, total_cost, total_pieces,
+                    calculate_cost_per_piece(total_cost, sum(parse_additional_expenses(expenses).values()), total_pieces),
+                    created_at
+                )
+                for bundle_id, name, total_cost, total_pieces, expenses, created_at in db.session.execute(stmt)
+            ]
         except Exception as e:
-            logging.error(f"Error getting all bundles: {e}")
-            return []
+            logging.error(f"Error getting bundle list: {e}")
+            return [], None
+        
+        if len(bundles) > limit:
+            return bundles[:limit], bundles[limit - 1].id
+        return bundles, None
+    
+    @staticmethod
+    def get_store_summary():
+        """Get the current store's rollup totals without scanning its bundles"""
+        try:
+            rollup = db.session.get(StoreRollup, current_store_id())
+        except Exception as e:
+            logging.error(f"Error getting store summary: {e}")
+            rollup = None
+        
+        if rollup is None:
+            rollup = StoreRollup(bundle_count=0, total_cost=0, total_additional_expenses=0,
+                                 **{f'{quality}_basis': 0 for quality in QUALITIES})
+        return rollup
+    
+    @staticmethod
+    def rebuild_store_rollups():
+        """Recompute every store rollup from the live bundles"""
+        try:
+            totals = {}
+            rows = db.session.execute(
+                db.select(Bundle.store_id, Bundle.total_cost, Bundle.additional_expenses,
+                          Bundle.total_pieces, Bundle.classification)
+                .execution_options(yield_per=1000)
+            )
+            for store_id, total_cost, expenses, total_pieces, classification in rows:
+                delta = _store_rollup_delta(
+                    total_cost,
+                    sum(parse_additional_expenses(expenses).values()),
+                    total_pieces,
+                    parse_classification(classification).get('by_quality', {})
+                )
+                totals[store_id] = _merge_deltas(totals.get(store_id, {}), delta)
+            
+            db.session.execute(delete(StoreRollup))
+            for store_id, delta in totals.items():
+                db.session.add(StoreRollup(store_id=store_id, **delta))
+            db.session.commit()
+            
+            return len(totals)
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error rebuilding store rollups: {e}")
+            raise Exception("Error al recalcular los resúmenes de tiendas")
     
     @staticmethod
     def get_bundle(bundle_id):
         """Get a specific bundle by ID"""
         try:
-            bundle = Bundle.query.get(bundle_id)
+            bundle = _get_store_bundle(bundle_id)
             return bundle.to_dict() if bundle else None
         except Exception as e:
             logging.error(f"Error getting bundle {bundle_id}: {e}")
             return None
     
     @staticmethod
-    def save_bundle(bundle_data):
-        """Save a new bundle to the database"""
+    def get_bundles(bundle_ids):
+        """Get several bundles of the current store by ID, in the requested order"""
         try:
-            bundle = Bundle(
-                name=bundle_data['name'],
-                total_cost=bundle_data['total_cost'],
-                total_pieces=bundle_data['total_pieces']
-            )
+            bundles = {
+                bundle.id: bundle
+                for bundle in Bundle.query.filter(
+                    Bundle.store_id == current_store_id(),
+                    Bundle.id.in_(bundle_ids)
+                )
+            }
+            return [bundles[bundle_id].to_dict() for bundle_id in bundle_ids if bundle_id in bundles]
+        except Exception as e:
+            logging.error(f"Error getting bundles {bundle_ids}: {e}")
+            return []
+    
+    @staticmethod
+    def save_bundle(bundle_data, client_key=None):
+        """Save a new bundle; a repeated client_key returns the existing bundle's ID"""
+        try:
+            store_id = current_store_id()
+            if client_key:
+                existing_id = db.session.execute(
+                    db.select(Bundle.id).where(Bundle.store_id == store_id, Bundle.client_key == client_key)
+                ).scalar()
+                if existing_id:
+                    return existing_id
             
-            bundle.set_additional_expenses(bundle_data['additional_expenses'])
-            bundle.set_classification(bundle_data['classification'])
+            bundle = Bundle(store_id=store_id, client_key=client_key or None)
+            _apply_bundle_data(bundle, bundle_data)
             
             db.session.add(bundle)
+            _apply_store_rollup(bundle.store_id, _bundle_rollup_delta(bundle))
+            
+            changes = _ChangeLog()
+            changes.record(bundle, store_id, 'create', new=_bundle_snapshot(bundle))
+            changes.flush()
             db.session.commit()
             
             return bundle.id
@@ -52,18 +387,21 @@ class DataService:
     def update_bundle(bundle_id, bundle_data):
         """Update an existing bundle"""
         try:
-            bundle = Bundle.query.get(bundle_id)
+            bundle = _get_store_bundle(bundle_id)
             if not bundle:
                 return False
             
-            bundle.name = bundle_data['name']
-            bundle.total_cost = bundle_data['total_cost']
-            bundle.total_pieces = bundle_data['total_pieces']
+            old_delta = _bundle_rollup_delta(bundle, sign=-1)
+            old_snapshot = _bundle_snapshot(bundle)
+            
+            _apply_bundle_data(bundle, bundle_data)
             bundle.updated_at = datetime.utcnow()
             
-            bundle.set_additional_expenses(bundle_data['additional_expenses'])
-            bundle.set_classification(bundle_data['classification'])
+            _apply_store_rollup(bundle.store_id, _merge_deltas(old_delta, _bundle_rollup_delta(bundle)))
             
+            changes = _ChangeLog()
+            changes.record(bundle, bundle.store_id, 'update', old=old_snapshot, new=_bundle_snapshot(bundle))
+            changes.flush()
             db.session.commit()
             return True
         except Exception as e:
@@ -71,14 +409,105 @@ class DataService:
             logging.error(f"Error updating bundle {bundle_id}: {e}")
             raise Exception("Error al actualizar la paca")
     
+    @staticmethod
+    def sync_bundles(operations):
+        """Apply a batch of queued offline creates and updates in one transaction"""
+        store_id = current_store_id()
+        creates = [op for op in operations if op['action'] == 'create']
+        updates = [op for op in operations if op['action'] == 'update']
+        
+        try:
+            # Resolve every client key and every updated bundle with one query each
+            by_key = {}
+            if creates:
+                by_key = dict(db.session.execute(
+                    db.select(Bundle.client_key, Bundle.id).where(
+                        Bundle.store_id == store_id,
+                        Bundle.client_key.in_([op['client_key'] for op in creates])
+                    )
+                ).all())
+            
+            by_id = {}
+            if updates:
+                by_id = {
+                    bundle.id: bundle
+                    for bundle in Bundle.query.filter(
+                        Bundle.store_id == store_id,
+                        Bundle.id.in_([op['bundle_id'] for op in updates])
+                    )
+                }
+            
+            results = []
+            deltas = []
+            changes = _ChangeLog()
+            
+            for op in operations:
+                result = {'client_key': op['client_key']}
+                results.append(result)
+                
+                if op['action'] == 'create':
+                    if op['client_key'] in by_key:
+                        result['status'] = 'duplicate'
+                        result['bundle'] = by_key[op['client_key']]
+                        continue
+                    
+                    bundle = Bundle(store_id=store_id, client_key=op['client_key'])
+                    _apply_bundle_data(bundle, op['bundle_data'])
+                    db.session.add(bundle)
+                    deltas.append(_bundle_rollup_delta(bundle))
+                    changes.record(bundle, store_id, 'create', new=_bundle_snapshot(bundle))
+                    
+                    by_key[op['client_key']] = bundle
+                    result['status'] = 'created'
+                    result['bundle'] = bundle
+                else:
+                    bundle = by_id.get(op['bundle_id'])
+                    if bundle is None:
+                        result['status'] = 'not_found'
+                        continue
+                    
+                    deltas.append(_bundle_rollup_delta(bundle, sign=-1))
+                    old_snapshot = _bundle_snapshot(bundle)
+                    _apply_bundle_data(bundle, op['bundle_data'])
+                    bundle.updated_at = datetime.utcnow()
+                    deltas.append(_bundle_rollup_delta(bundle))
+                    changes.record(bundle, store_id, 'update', old=old_snapshot, new=_bundle_snapshot(bundle))
+                    
+                    result['status'] = 'updated'
+                    result['bundle'] = bundle
+            
+            if deltas:
+                _apply_store_rollup(store_id, _merge_deltas(*deltas))
+            changes.flush()
+            db.session.commit()
+            
+            for result in results:
+                bundle = result.pop('bundle', None)
+                if bundle is not None:
+                    result['bundle_id'] = bundle if isinstance(bundle, int) else bundle.id
+            
+            return results
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error syncing bundles: {e}")
+            raise Exception("Error al sincronizar las pacas")
+    
     @staticmethod
     def delete_bundle(bundle_id):
         """Delete a bundle from the database"""
         try:
-            bundle = Bundle.query.get(bundle_id)
+            bundle = _get_store_bundle(bundle_id)
             if not bundle:
                 return False
             
+            _apply_store_rollup(bundle.store_id, _bundle_rollup_delta(bundle, sign=-1))
+            
+            changes = _ChangeLog()
+            changes.record(bundle.id, bundle.store_id, 'delete', old=_bundle_snapshot(bundle))
+            changes.flush()
+            
+            # The sales ledger is append-only: realized sales and their rollups outlive the
+            # bundle, and its ID is never handed out again
             db.session.delete(bundle)
             db.session.commit()
             return True
@@ -89,9 +518,16 @@ class DataService:
     
     @staticmethod
     def get_config():
-        """Get application configuration"""
+        """Get the current store's configuration, cached for CONFIG_CACHE_TTL seconds"""
+        store_id = current_store_id()
+        cached = _config_cache.get(store_id)
+        if cached and cached[0] > time.monotonic():
+            return copy.deepcopy(cached[1])
+        
         try:
-            return Config.get_config()
+            config = Config.get_config(store_id)
+            _config_cache[store_id] = (time.monotonic() + CONFIG_CACHE_TTL, config)
+            return copy.deepcopy(config)
         except Exception as e:
             logging.error(f"Error getting config: {e}")
             # Return default config
@@ -111,9 +547,275 @@ class DataService:
     
     @staticmethod
     def save_config(config_data):
-        """Save application configuration"""
+        """Save the current store's configuration"""
+        store_id = current_store_id()
         try:
-            Config.set_config(config_data)
+            Config.set_config(config_data, store_id)
+            _config_cache.pop(store_id, None)
         except Exception as e:
             logging.error(f"Error saving config: {e}")
-            raise Exception("Error al guardar la configuración")
\ No newline at end of file
+            raise Exception("Error al guardar la configuración")
+    
+    @staticmethod
+    def get_missing_bundle_ids(bundle_ids):
+        """Return the subset of bundle IDs that are neither live nor archived"""
+        wanted = set(bundle_ids)
+        if not wanted:
+            return set()
+        store_id = current_store_id()
+        
+        # Archived bundles may still have pieces left to sell
+        found = db.session.execute(
+            db.select(Bundle.id).where(Bundle.id.in_(wanted), Bundle.store_id == store_id)
+            .union_all(
+                db.select(ArchivedBundle.id).where(ArchivedBundle.id.in_(wanted), ArchivedBundle.store_id == store_id)
+            )
+        ).scalars()
+        return wanted - set(found)
+    
+    @staticmethod
+    def record_sales(sales):
+        """Append a batch of sales to the ledger and update the rollups.
+        
+        The batch is all or nothing: if it would sell more pieces of a quality
+        than the bundle has, nothing is written. Returns (recorded, oversold).
+        """
+        if not sales:
+            return 0, []
+        
+        try:
+            now = datetime.utcnow()
+            rows = []
+            totals = {}
+            
+            for sale in sales:
+                amount = sale['quantity'] * sale['unit_price']
+                rows.append({
+                    'bundle_id': sale['bundle_id'],
+                    'quality': sale['quality'],
+                    'quantity': sale['quantity'],
+                    'unit_price': sale['unit_price'],
+                    'amount': amount,
+                    'sold_at': sale.get('sold_at') or now
+                })
+                
+                key = (sale['bundle_id'], sale['quality'])
+                pieces, revenue = totals.get(key, (0, 0.0))
+                totals[key] = (pieces + sale['quantity'], revenue + amount)
+            
+            db.session.execute(insert(Sale), rows)
+            _upsert_sales_rollups(totals)
+            
+            # Checked after the upsert, against totals that include concurrent batches
+            oversold = _oversold_rollups(totals)
+            if oversold:
+                db.session.rollback()
+                return 0, oversold
+            
+            db.session.commit()
+            
+            return len(rows), []
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error recording sales: {e}")
+            raise Exception("Error al registrar las ventas")
+    
+    @staticmethod
+    def get_sales_summary(bundle_id):
+        """Get realized sales totals for a bundle from the rollup table"""
+        summary = {'by_quality': {}, 'pieces_sold': 0, 'revenue': 0}
+        try:
+            rollups = SalesRollup.query.filter_by(bundle_id=bundle_id).all()
+        except Exception as e:
+            logging.error(f"Error getting sales summary for bundle {bundle_id}: {e}")
+            return summary
+        
+        for rollup in rollups:
+            summary['by_quality'][rollup.quality] = {
+                'pieces_sold': rollup.pieces_sold,
+                'revenue': rollup.revenue
+            }
+            summary['pieces_sold'] += rollup.pieces_sold
+            summary['revenue'] += rollup.revenue
+        
+        return summary
+    
+    @staticmethod
+    def archive_bundle_batch(cutoff, batch_size=500):
+        """Move one batch of closed bundles (sold out or created before cutoff) to the archive"""
+        try:
+            sold = (
+                db.select(SalesRollup.bundle_id, func.sum(SalesRollup.pieces_sold).label('pieces_sold'))
+                .group_by(SalesRollup.bundle_id)
+                .subquery()
+            )
+            bundle_ids = db.session.execute(
+                db.select(Bundle.id)
+                .outerjoin(sold, sold.c.bundle_id == Bundle.id)
+                .where(or_(Bundle.created_at < cutoff, sold.c.pieces_sold >= Bundle.total_pieces))
+                .where(~_archived_id_exists())
+                .order_by(Bundle.id)
+                .limit(batch_size)
+            ).scalars().all()
+            
+            if not bundle_ids:
+                return 0
+            
+            store_deltas = {}
+            changes = _ChangeLog()
+            rows = db.session.execute(
+                db.select(Bundle.id, Bundle.store_id, Bundle.total_cost, Bundle.additional_expenses,
+                          Bundle.total_pieces, Bundle.classification)
+                .where(Bundle.id.in_(bundle_ids))
+            )
+            for bundle_id, store_id, total_cost, expenses, total_pieces, classification in rows:
+                changes.record(bundle_id, store_id, 'archive')
+                delta = _store_rollup_delta(
+                    total_cost,
+                    sum(parse_additional_expenses(expenses).values()),
+                    total_pieces,
+                    parse_classification(classification).get('by_quality', {}),
+                    sign=-1
+                )
+                store_deltas[store_id] = _merge_deltas(store_deltas.get(store_id, {}), delta)
+            
+            columns = [column.name for column in Bundle.__table__.columns]
+            db.session.execute(
+                insert(ArchivedBundle).from_select(
+                    columns + ['archived_at'],
+                    db.select(*Bundle.__table__.columns, literal(datetime.utcnow()))
+                    .where(Bundle.id.in_(bundle_ids))
+                )
+            )
+            db.session.execute(delete(Bundle).where(Bundle.id.in_(bundle_ids)))
+            for store_id, delta in store_deltas.items():
+                _apply_store_rollup(store_id, delta)
+            changes.flush()
+            db.session.commit()
+            
+            return len(bundle_ids)
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error archiving bundles: {e}")
+            raise Exception("Error al archivar las pacas")
+    
+    @staticmethod
+    def get_archive_id_conflicts():
+        """Get live bundle IDs that are already taken in the archive, so they cannot be archived"""
+        try:
+            return db.session.execute(
+                db.select(Bundle.id).where(_archived_id_exists()).order_by(Bundle.id)
+            ).scalars().all()
+        except Exception as e:
+            logging.error(f"Error checking archive ID conflicts: {e}")
+            return []
+    
+    @staticmethod
+    def get_archived_bundles(before=None, limit=ARCHIVE_PAGE_SIZE):
+        """Get one page of the history list, most recently archived first.
+        
+        Returns (bundles, next_before); pass next_before back as before to
+        get the following page, or stop when it is None.
+        """
+        try:
+            store_id = current_store_id()
+            stmt = (
+                db.select(
+                    ArchivedBundle.id, ArchivedBundle.name, ArchivedBundle.total_cost,
+                    ArchivedBundle.total_pieces, ArchivedBundle.created_at, ArchivedBundle.archived_at
+                )
+                .where(ArchivedBundle.store_id == store_id)
+                .order_by(ArchivedBundle.archived_at.desc(), ArchivedBundle.id.desc())
+                .limit(limit + 1)
+            )
+            if before is not None:
+                cursor = db.session.execute(
+                    db.select(ArchivedBundle.archived_at, ArchivedBundle.id)
+                    .where(ArchivedBundle.id == before, ArchivedBundle.store_id == store_id)
+                ).first()
+                if cursor is None:
+                    return [], None
+                stmt = stmt.where(tuple_(ArchivedBundle.archived_at, ArchivedBundle.id) < tuple(cursor))
+            
+            bundles = [ArchivedBundleRow(*row) for row in db.session.execute(stmt)]
+        except Exception as e:
+            logging.error(f"Error getting archived bundles: {e}")
+            return [], None
+        
+        if len(bundles) > limit:
+            return bundles[:limit], bundles[limit - 1].id
+        return bundles, None
+    
+    @staticmethod
+    def get_archived_bundle(bundle_id):
+        """Get a specific archived bundle by ID"""
+        try:
+            bundle = ArchivedBundle.query.filter_by(id=bundle_id, store_id=current_store_id()).first()
+            return bundle.to_dict() if bundle else None
+        except Exception as e:
+            logging.error(f"Error getting archived bundle {bundle_id}: {e}")
+            return None
+    
+    @staticmethod
+    def iter_archived_bundles(batch_size=500):
+        """Stream archived bundle export rows oldest first without loading them all at once"""
+        stmt = (
+            db.select(
+                ArchivedBundle.id, ArchivedBundle.name, ArchivedBundle.total_cost, ArchivedBundle.total_pieces,
+                ArchivedBundle.additional_expenses, ArchivedBundle.classification,
+                ArchivedBundle.created_at, ArchivedBundle.archived_at
+            )
+            .where(ArchivedBundle.store_id == current_store_id())
+            .order_by(ArchivedBundle.archived_at, ArchivedBundle.id)
+            .execution_options(yield_per=batch_size)
+        )
+        for bundle_id, name, total_cost, total_pieces, expenses, classification, created_at, archived_at in db.session.execute(stmt):
+            yield ArchivedExportRow(
+                bundle_id, name, total_cost, total_pieces,
+                sum(parse_additional_expenses(expenses).values()),
+                parse_classification(classification).get('by_quality', {}),
+                created_at, archived_at
+            )
+    
+    @staticmethod
+    def create_store(name):
+        """Create a new store and return its ID"""
+        try:
+            store = Store(name=name)
+            db.session.add(store)
+            db.session.commit()
+            invalidate_stores()
+            return store.id
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error creating store: {e}")
+            raise Exception("Error al crear la tienda")
+    
+    @staticmethod
+    def get_bundle_history(bundle_id, before=None, limit=HISTORY_PAGE_SIZE):
+        """Get one page of a bundle's change history, newest first.
+        
+        Returns (changes, next_before); pass next_before back as before to
+        get the following page, or stop when it is None.
+        """
+        try:
+            stmt = (
+                db.select(
+                    BundleChange.id, BundleChange.action, BundleChange.field,
+                    BundleChange.old_value, BundleChange.new_value, BundleChange.changed_at
+                )
+                .where(BundleChange.bundle_id == bundle_id, BundleChange.store_id == current_store_id())
+                .order_by(BundleChange.id.desc())
+                .limit(limit + 1)
+            )
+            if before is not None:
+                stmt = stmt.where(BundleChange.id < before)
+            
+            changes = [_change_row(*row) for row in db.session.execute(stmt)]
+        except Exception as e:
+            logging.error(f"Error getting history for bundle {bundle_id}: {e}")
+            return [], None
+        
+        if len(changes) > limit:
+            return changes[:limit], changes[limit - 1].id
+        return changes, None
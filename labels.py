@@ -0,0 +1,101 @@
+"""
+Price tag generation in ZPL (Zebra printer language).
+
+Labels are split into chunks that are rendered independently, so a batch of
+bundles can be rendered across a process pool and streamed in order while
+only a bounded number of chunks is held in memory. This module must not
+import the Flask app: worker processes only need the render function.
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from utils import format_currency
+
+LABELS_PER_CHUNK = 100
+
+# Below this many labels the pool costs more than it saves
+PARALLEL_THRESHOLD = 1000
+
+LABEL_WORKERS = int(os.environ.get('LABEL_WORKERS', min(os.cpu_count() or 1, 4)))
+
+QUALITY_NAMES = {
+    'premium': 'PREMIUM',
+    'regular': 'REGULAR',
+    'economica': 'ECONOMICA',
+    'rechazo': 'RECHAZO'
+}
+
+_executor = None
+
+
+def _zpl_text(value):
+    """Strip characters that ZPL treats as commands from field data"""
+    return str(value).replace('^', ' ').replace('~', ' ')
+
+def label_jobs(bundle, metrics):
+    """Split a bundle's labels (one per piece, at its ideal price) into render jobs"""
+    jobs = []
+    for item in metrics['quality_breakdown']:
+        for start in range(0, item['pieces'], LABELS_PER_CHUNK):
+            jobs.append({
+                'bundle_id': bundle['id'],
+                'bundle_name': bundle['name'],
+                'quality': item['quality'],
+                'price': item['ideal_price'],
+                'start': start,
+                'count': min(LABELS_PER_CHUNK, item['pieces'] - start)
+            })
+    return jobs
+
+def render_zpl_labels(job):
+    """Render one job's labels as a ZPL string"""
+    name = _zpl_text(job['bundle_name'])[:30]
+    quality = QUALITY_NAMES.get(job['quality'], _zpl_text(job['quality']).upper())
+    price = format_currency(job['price'])
+    code_prefix = f"{job['bundle_id']}-{job['quality'][:3].upper()}"
+
+    labels = []
+    for number in range(job['start'] + 1, job['start'] + job['count'] + 1):
+        labels.append(
+            "^XA^CI28"
+            f"^CF0,28^FO20,20^FD{name}^FS"
+            f"^CF0,24^FO20,55^FD{quality}^FS"
+            f"^CF0,60^FO20,90^FD{price}^FS"
+            f"^BY2^FO20,165^BCN,50,Y,N,N^FD{code_prefix}-{number:04d}^FS"
+            "^XZ\n"
+        )
+    return ''.join(labels)
+
+def _get_executor():
+    """Create the shared label process pool on first use"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=LABEL_WORKERS)
+    return _executor
+
+def stream_labels(jobs):
+    """Yield rendered chunks in order, keeping at most a few chunks in flight"""
+    total_labels = sum(job['count'] for job in jobs)
+
+    if LABEL_WORKERS <= 1 or total_labels < PARALLEL_THRESHOLD:
+        for job in jobs:
+            yield render_zpl_labels(job)
+        return
+
+    executor = _get_executor()
+    window = LABEL_WORKERS * 2
+    pending = deque()
+
+    try:
+        for job in jobs:
+            pending.append(executor.submit(render_zpl_labels, job))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Client went away: drop chunks that have not started yet
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,105 @@
+"""
+Migration script to stop bundle IDs from being reused.
+
+Archived bundles keep their original ID, and sales, rollups and change history
+refer to bundles by ID, so a freed ID must never be handed out again. On
+SQLite that needs AUTOINCREMENT, which only applies to newly created tables:
+databases created before it was declared get their bundles table rebuilt. On
+both SQLite and PostgreSQL the ID counter is then moved past every ID in
+bundles and bundles_archive. Run it after migrate_client_keys.py.
+"""
+from sqlalchemy import func, literal, text
+from app import app, db
+from models import Bundle
+
+
+def uses_autoincrement():
+    """Check whether the SQLite bundles table was created with AUTOINCREMENT"""
+    sql = db.session.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'bundles'")
+    ).scalar()
+    return 'AUTOINCREMENT' in (sql or '').upper()
+
+def rebuild_bundles_table():
+    """Recreate the SQLite bundles table with AUTOINCREMENT, keeping every row"""
+    if uses_autoincrement():
+        print("bundles already uses AUTOINCREMENT")
+        return
+
+    inspector = db.inspect(db.engine)
+    old_columns = {column['name'] for column in inspector.get_columns('bundles')}
+
+    # Index names follow the renamed table, so drop them before recreating
+    for index in inspector.get_indexes('bundles'):
+        db.session.execute(text(f"DROP INDEX IF EXISTS {index['name']}"))
+
+    db.session.execute(text("ALTER TABLE bundles RENAME TO bundles_old"))
+    Bundle.__table__.create(bind=db.session.connection())
+
+    # Columns added after the table was created take their model default
+    columns = []
+    values = []
+    for column in Bundle.__table__.columns:
+        if column.name in old_columns:
+            values.append(text(column.name))
+        elif column.default is not None and column.default.is_scalar:
+            values.append(literal(column.default.arg))
+        else:
+            continue
+        columns.append(column.name)
+
+    db.session.execute(
+        Bundle.__table__.insert().from_select(columns, db.select(*values).select_from(text('bundles_old')))
+    )
+    db.session.execute(text("DROP TABLE bundles_old"))
+    db.session.commit()
+    print("Rebuilt bundles with AUTOINCREMENT")
+
+def get_max_bundle_id():
+    """Highest ID used by a live or archived bundle"""
+    max_ids = [db.session.execute(db.select(func.max(Bundle.id))).scalar() or 0]
+    if db.inspect(db.engine).has_table('bundles_archive'):
+        max_ids.append(db.session.execute(text("SELECT MAX(id) FROM bundles_archive")).scalar() or 0)
+    return max(max_ids)
+
+def advance_id_counter():
+    """Move the bundles ID counter past every live and archived ID, never backwards"""
+    max_id = get_max_bundle_id()
+
+    if db.engine.dialect.name == 'postgresql':
+        sequence = db.session.execute(text("SELECT pg_get_serial_sequence('bundles', 'id')")).scalar()
+        last_value, is_called = db.session.execute(text(f"SELECT last_value, is_called FROM {sequence}")).one()
+        # An unused sequence hands out last_value itself next
+        current = last_value if is_called else last_value - 1
+        if max_id > current:
+            db.session.execute(text("SELECT setval(:sequence, :value)"), {'sequence': sequence, 'value': max_id})
+    else:
+        current = db.session.execute(
+            text("SELECT seq FROM sqlite_sequence WHERE name = 'bundles'")
+        ).scalar()
+        if current is None:
+            db.session.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('bundles', :value)"),
+                               {'value': max_id})
+        elif max_id > current:
+            db.session.execute(text("UPDATE sqlite_sequence SET seq = :value WHERE name = 'bundles'"),
+                               {'value': max_id})
+
+    db.session.commit()
+    print(f"Next bundle ID will be above {max(max_id, current or 0)}")
+
+def main():
+    """Main migration function"""
+    print("Starting bundle ID migration...")
+
+    with app.app_context():
+        # Create tables if they don't exist
+        db.create_all()
+
+        if db.engine.dialect.name == 'sqlite':
+            rebuild_bundles_table()
+        advance_id_counter()
+
+        print("Bundle ID migration completed successfully!")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Migration script to add client_key (offline intake idempotency key) to an
+existing database. Run it after migrate_stores.py.
+"""
+from sqlalchemy import text
+from app import app, db
+from migrate_indexes import create_missing_indexes
+
+BUNDLE_TABLES = ['bundles', 'bundles_archive']
+
+
+def add_client_key_columns():
+    """Add client_key to the bundle tables that lack it"""
+    inspector = db.inspect(db.engine)
+
+    for table in BUNDLE_TABLES:
+        columns = {column['name'] for column in inspector.get_columns(table)}
+        if 'client_key' in columns:
+            continue
+
+        db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN client_key VARCHAR(64)"))
+        print(f"Added client_key to {table}")
+
+    db.session.commit()
+
+def main():
+    """Main migration function"""
+    print("Starting client key migration...")
+
+    with app.app_context():
+        # Create tables if they don't exist
+        db.create_all()
+
+        add_client_key_columns()
+        create_missing_indexes()
+
+        print("Client key migration completed successfully!")
+
+if __name__ == '__main__':
+    main()
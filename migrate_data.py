@@ -5,7 +5,8 @@ import json
 import os
 from datetime import datetime
 from app import app, db
-from models import Bundle, Config
+from models import DEFAULT_STORE_ID, Bundle, Config
+from data_service import DataService
 import logging
 
 def migrate_bundles_from_json():
@@ -24,13 +25,14 @@ def migrate_bundles_from_json():
         
         for bundle_data in bundles_data:
             # Check if bundle already exists
-            existing_bundle = Bundle.query.filter_by(name=bundle_data['name']).first()
+            existing_bundle = Bundle.query.filter_by(store_id=DEFAULT_STORE_ID, name=bundle_data['name']).first()
             if existing_bundle:
                 print(f"Bundle '{bundle_data['name']}' already exists, skipping")
                 continue
             
             # Create new bundle
             bundle = Bundle(
+                store_id=DEFAULT_STORE_ID,
                 name=bundle_data['name'],
                 total_cost=bundle_data['total_cost'],
                 total_pieces=bundle_data['total_pieces']
@@ -70,12 +72,13 @@ def migrate_config_from_json():
         with open(json_file, 'r', encoding='utf-8') as f:
             config_data = json.load(f)
         
-        # Clear existing config
-        Config.query.delete()
+        # Clear existing config of the default store
+        Config.query.filter_by(store_id=DEFAULT_STORE_ID).delete()
         
         # Add new config
         for key, value in config_data.items():
             config_item = Config(
+                store_id=DEFAULT_STORE_ID,
                 key=key,
                 value=json.dumps(value) if isinstance(value, (dict, list)) else str(value)
             )
@@ -123,6 +126,7 @@ def main():
         # Migrate data
         migrate_config_from_json()
         migrate_bundles_from_json()
+        DataService.rebuild_store_rollups()
         
         print("Data migration completed successfully!")
 
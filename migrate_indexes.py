@@ -0,0 +1,64 @@
+"""
+Migration script to add the declared secondary indexes to an existing database.
+
+db.create_all() only creates indexes together with new tables, so databases
+created before the indexes were declared in models.py need this once. Run it
+last, after migrate_stores.py, migrate_client_keys.py and migrate_bundle_ids.py.
+"""
+from sqlalchemy import text
+from app import app, db
+import models
+
+# Indexes superseded by a wider index declared on the models
+REPLACED_INDEXES = ['ix_bundles_store_created_at', 'ix_bundles_archive_store_archived_at']
+
+
+def create_missing_indexes():
+    """Create every index declared on the models that is not in the database yet.
+
+    Indexes on columns that a later migration adds are skipped and reported;
+    that migration creates them.
+    """
+    created_count = 0
+
+    for table in db.metadata.sorted_tables:
+        inspector = db.inspect(db.engine)
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+
+            missing = [column.name for column in index.columns if column.name not in columns]
+            if missing:
+                print(f"Skipped index {index.name} on {table.name}: missing columns {', '.join(missing)}")
+                continue
+
+            index.create(bind=db.engine)
+            print(f"Created index {index.name} on {table.name}")
+            created_count += 1
+
+    print(f"Successfully created {created_count} indexes")
+
+def drop_replaced_indexes():
+    """Drop indexes that a declared index has replaced"""
+    for index in REPLACED_INDEXES:
+        db.session.execute(text(f"DROP INDEX IF EXISTS {index}"))
+    db.session.commit()
+
+def main():
+    """Main migration function"""
+    print("Starting index migration...")
+
+    with app.app_context():
+        # Create tables if they don't exist
+        db.create_all()
+
+        drop_replaced_indexes()
+        create_missing_indexes()
+
+        print("Index migration completed successfully!")
+
+if __name__ == '__main__':
+    main()
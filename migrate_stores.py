@@ -0,0 +1,83 @@
+"""
+Migration script to add the store dimension to an existing database.
+
+Adds store_id to bundles, bundles_archive and config (existing rows go to the
+default store), makes config keys unique per store, swaps the single-column
+bundle indexes for store-scoped ones and builds the store rollups. Run it
+first of the migrations listed in replit.md.
+"""
+from sqlalchemy import text
+from app import app, db
+from data_service import DataService
+from migrate_indexes import create_missing_indexes
+from models import DEFAULT_STORE_ID, Config, Store
+
+STORE_TABLES = ['bundles', 'bundles_archive', 'config']
+OLD_INDEXES = ['ix_bundles_created_at', 'ix_bundles_name', 'ix_bundles_archive_archived_at']
+
+
+def add_store_columns():
+    """Add store_id to every store-scoped table that lacks it"""
+    inspector = db.inspect(db.engine)
+
+    for table in STORE_TABLES:
+        columns = {column['name'] for column in inspector.get_columns(table)}
+        if 'store_id' in columns:
+            continue
+
+        db.session.execute(text(
+            f"ALTER TABLE {table} ADD COLUMN store_id INTEGER NOT NULL DEFAULT {DEFAULT_STORE_ID}"
+        ))
+        print(f"Added store_id to {table}")
+
+    db.session.commit()
+
+def scope_config_keys():
+    """Replace the global unique key on config with a per-store one"""
+    constraints = {constraint['name'] for constraint in db.inspect(db.engine).get_unique_constraints('config')}
+    if 'uq_config_store_key' in constraints:
+        return
+
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text("ALTER TABLE config DROP CONSTRAINT IF EXISTS config_key_key"))
+        db.session.execute(text("ALTER TABLE config ADD CONSTRAINT uq_config_store_key UNIQUE (store_id, key)"))
+    else:
+        # SQLite cannot drop constraints, so rebuild the table
+        db.session.execute(text("ALTER TABLE config RENAME TO config_old"))
+        Config.__table__.create(bind=db.session.connection())
+        db.session.execute(text(
+            "INSERT INTO config (id, store_id, key, value, updated_at) "
+            "SELECT id, store_id, key, value, updated_at FROM config_old"
+        ))
+        db.session.execute(text("DROP TABLE config_old"))
+
+    db.session.commit()
+    print("Config keys are now unique per store")
+
+def drop_old_indexes():
+    """Drop the single-column indexes replaced by store-scoped ones"""
+    for index in OLD_INDEXES:
+        db.session.execute(text(f"DROP INDEX IF EXISTS {index}"))
+    db.session.commit()
+
+def main():
+    """Main migration function"""
+    print("Starting store migration...")
+
+    with app.app_context():
+        # Create tables if they don't exist
+        db.create_all()
+        Store.ensure_default()
+
+        add_store_columns()
+        scope_config_keys()
+        drop_old_indexes()
+        create_missing_indexes()
+
+        stores = DataService.rebuild_store_rollups()
+        print(f"Rebuilt rollups for {stores} stores")
+
+        print("Store migration completed successfully!")
+
+if __name__ == '__main__':
+    main()
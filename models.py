@@ -2,11 +2,33 @@ from app import db
 from datetime import datetime
 import json
 
+DEFAULT_STORE_ID = 1
 
-class Bundle(db.Model):
-    __tablename__ = 'bundles'
+
+def parse_additional_expenses(raw):
+    """Parse an additional expenses JSON column value"""
+    try:
+        return json.loads(raw)
+    except (json.JSONDecodeError, TypeError):
+        return {'transport': 0, 'cleaning': 0, 'other': 0}
+
+
+def parse_classification(raw):
+    """Parse a classification JSON column value"""
+    try:
+        return json.loads(raw)
+    except (json.JSONDecodeError, TypeError):
+        return {
+            'by_type': {'hombre': 0, 'mujer': 0, 'ninos': 0, 'hogar': 0},
+            'by_quality': {'premium': 0, 'regular': 0, 'economica': 0, 'rechazo': 0}
+        }
+
+
+class BundleMixin:
+    """Columns and JSON helpers shared by live and archived bundles"""
     
     id = db.Column(db.Integer, primary_key=True)
+    store_id = db.Column(db.Integer, nullable=False, default=DEFAULT_STORE_ID)
     name = db.Column(db.String(200), nullable=False)
     total_cost = db.Column(db.Float, nullable=False)
     total_pieces = db.Column(db.Integer, nullable=False)
@@ -20,15 +42,12 @@ class Bundle(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def __repr__(self):
-        return f'<Bundle {self.name}>'
+    # Key generated by the client for offline intake, so replays are idempotent
+    client_key = db.Column(db.String(64))
     
     def get_additional_expenses(self):
         """Parse additional expenses from JSON"""
-        try:
-            return json.loads(self.additional_expenses)
-        except (json.JSONDecodeError, TypeError):
-            return {'transport': 0, 'cleaning': 0, 'other': 0}
+        return parse_additional_expenses(self.additional_expenses)
     
     def set_additional_expenses(self, expenses_dict):
         """Store additional expenses as JSON"""
@@ -36,13 +55,7 @@ class Bundle(db.Model):
     
     def get_classification(self):
         """Parse classification from JSON"""
-        try:
-            return json.loads(self.classification)
-        except (json.JSONDecodeError, TypeError):
-            return {
-                'by_type': {'hombre': 0, 'mujer': 0, 'ninos': 0, 'hogar': 0},
-                'by_quality': {'premium': 0, 'regular': 0, 'economica': 0, 'rechazo': 0}
-            }
+        return parse_classification(self.classification)
     
     def set_classification(self, classification_dict):
         """Store classification as JSON"""
@@ -62,11 +75,97 @@ class Bundle(db.Model):
         }
 
 
+class Bundle(BundleMixin, db.Model):
+    __tablename__ = 'bundles'
+    __table_args__ = (
+        # id breaks ties between bundles created at the same time when paging
+        db.Index('ix_bundles_store_created_at_id', 'store_id', 'created_at', 'id'),
+        db.Index('ix_bundles_store_name', 'store_id', 'name'),
+        db.Index('uq_bundles_store_client_key', 'store_id', 'client_key', unique=True),
+        # Never reuse IDs on SQLite: archived bundles keep theirs
+        {'sqlite_autoincrement': True},
+    )
+    
+    def __repr__(self):
+        return f'<Bundle {self.name}>'
+
+
+class ArchivedBundle(BundleMixin, db.Model):
+    __tablename__ = 'bundles_archive'
+    __table_args__ = (
+        # id breaks ties between bundles archived in the same batch when paging
+        db.Index('ix_bundles_archive_store_archived_at_id', 'store_id', 'archived_at', 'id'),
+    )
+    
+    # Keep the original bundle ID so sales ledger rows still resolve
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ArchivedBundle {self.name}>'
+    
+    def to_dict(self):
+        """Convert to dictionary, including the archive timestamp"""
+        data = super().to_dict()
+        data['archived_at'] = self.archived_at.isoformat() if self.archived_at else None
+        return data
+
+
+class Store(db.Model):
+    __tablename__ = 'stores'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Store {self.name}>'
+    
+    @staticmethod
+    def ensure_default():
+        """Create the default store if it does not exist yet"""
+        if not db.session.get(Store, DEFAULT_STORE_ID):
+            db.session.add(Store(id=DEFAULT_STORE_ID, name='Principal'))
+            db.session.commit()
+        
+        if db.engine.dialect.name == 'postgresql':
+            # An explicit ID does not advance the sequence, so the next store would collide
+            sequence = db.session.execute(db.text("SELECT pg_get_serial_sequence('stores', 'id')")).scalar()
+            last_value, is_called = db.session.execute(db.text(f"SELECT last_value, is_called FROM {sequence}")).one()
+            max_id = db.session.execute(db.select(db.func.max(Store.id))).scalar()
+            if max_id > (last_value if is_called else last_value - 1):
+                db.session.execute(db.text("SELECT setval(:sequence, :value)"), {'sequence': sequence, 'value': max_id})
+            db.session.commit()
+
+
+class StoreRollup(db.Model):
+    __tablename__ = 'store_rollups'
+    
+    # Running totals over a store's live bundles; each *_basis column is
+    # the sum of cost per piece times pieces of that quality
+    store_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    bundle_count = db.Column(db.Integer, nullable=False, default=0)
+    total_cost = db.Column(db.Float, nullable=False, default=0)
+    total_additional_expenses = db.Column(db.Float, nullable=False, default=0)
+    premium_basis = db.Column(db.Float, nullable=False, default=0)
+    regular_basis = db.Column(db.Float, nullable=False, default=0)
+    economica_basis = db.Column(db.Float, nullable=False, default=0)
+    rechazo_basis = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<StoreRollup {self.store_id}>'
+
+
 class Config(db.Model):
     __tablename__ = 'config'
+    __table_args__ = (
+        db.UniqueConstraint('store_id', 'key', name='uq_config_store_key'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    key = db.Column(db.String(100), unique=True, nullable=False)
+    store_id = db.Column(db.Integer, nullable=False, default=DEFAULT_STORE_ID)
+    key = db.Column(db.String(100), nullable=False)
     value = db.Column(db.Text, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -74,9 +173,9 @@ class Config(db.Model):
         return f'<Config {self.key}>'
     
     @staticmethod
-    def get_config():
-        """Get complete configuration as dictionary"""
-        config_items = Config.query.all()
+    def get_config(store_id=DEFAULT_STORE_ID):
+        """Get complete configuration of a store as dictionary"""
+        config_items = Config.query.filter_by(store_id=store_id).all()
         config_dict = {}
         
         for item in config_items:
@@ -104,19 +203,77 @@ class Config(db.Model):
         return config_dict
     
     @staticmethod
-    def set_config(config_dict):
-        """Set complete configuration from dictionary"""
+    def set_config(config_dict, store_id=DEFAULT_STORE_ID):
+        """Set complete configuration of a store from dictionary"""
+        existing = {
+            item.key: item
+            for item in Config.query.filter(Config.store_id == store_id, Config.key.in_(list(config_dict))).all()
+        }
+        
         for key, value in config_dict.items():
-            config_item = Config.query.filter_by(key=key).first()
+            config_item = existing.get(key)
             
             if config_item:
                 config_item.value = json.dumps(value) if isinstance(value, (dict, list)) else str(value)
                 config_item.updated_at = datetime.utcnow()
             else:
                 config_item = Config(
+                    store_id=store_id,
                     key=key,
                     value=json.dumps(value) if isinstance(value, (dict, list)) else str(value)
                 )
                 db.session.add(config_item)
         
-        db.session.commit()
\ No newline at end of file
+        db.session.commit()
+
+
+class Sale(db.Model):
+    __tablename__ = 'sales'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    bundle_id = db.Column(db.Integer, nullable=False, index=True)
+    quality = db.Column(db.String(20), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    unit_price = db.Column(db.Float, nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    sold_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Sale {self.bundle_id}/{self.quality} x{self.quantity}>'
+
+
+class SalesRollup(db.Model):
+    __tablename__ = 'sales_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('bundle_id', 'quality', name='uq_sales_rollups_bundle_quality'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    bundle_id = db.Column(db.Integer, nullable=False)
+    quality = db.Column(db.String(20), nullable=False)
+    pieces_sold = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SalesRollup {self.bundle_id}/{self.quality}>'
+
+
+class BundleChange(db.Model):
+    __tablename__ = 'bundle_changes'
+    __table_args__ = (
+        db.Index('ix_bundle_changes_bundle_id_id', 'bundle_id', 'id'),
+    )
+    
+    # Append-only: one row per changed field (or per create/delete/archive event)
+    id = db.Column(db.Integer, primary_key=True)
+    bundle_id = db.Column(db.Integer, nullable=False)
+    store_id = db.Column(db.Integer, nullable=False, default=DEFAULT_STORE_ID)
+    action = db.Column(db.String(20), nullable=False)
+    field = db.Column(db.String(60))
+    old_value = db.Column(db.Text)
+    new_value = db.Column(db.Text)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<BundleChange {self.bundle_id} {self.action} {self.field}>'
@@ -0,0 +1,143 @@
+"""
+On-demand request profiling.
+
+A request is profiled with cProfile when it carries the X-Profile header or
+the ?__profile= query flag set to PROFILE_SECRET, or when it is picked by
+PROFILE_SAMPLE_RATE and then turns out slower than PROFILE_SLOW_MS. Results
+are written as pstats files to PROFILE_DIR, which is trimmed to
+PROFILE_MAX_FILES / PROFILE_MAX_BYTES. Requests that are not profiled only
+pay for a header lookup.
+"""
+import cProfile
+import hashlib
+import hmac
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import time
+from datetime import datetime
+from flask import g, request, session
+
+PROFILE_SUFFIX = '.prof'
+PROFILE_SESSION_KEY = 'profile_admin'
+
+
+def check_profile_secret(app, token):
+    """Compare a token against PROFILE_SECRET; always False when no secret is set"""
+    secret = app.config['PROFILE_SECRET']
+    # compare_digest rejects non-ASCII str, so compare the encoded bytes
+    return bool(secret) and bool(token) and hmac.compare_digest(token.encode(), secret.encode())
+
+def _secret_fingerprint(secret):
+    """Stand-in for the secret in the session cookie, which is signed but readable"""
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+def grant_profile_session(app):
+    """Remember in the session that this browser passed the secret check"""
+    session[PROFILE_SESSION_KEY] = _secret_fingerprint(app.config['PROFILE_SECRET'])
+
+def has_profile_session(app):
+    """Check the session flag; changing or unsetting PROFILE_SECRET revokes it"""
+    secret = app.config['PROFILE_SECRET']
+    granted = session.get(PROFILE_SESSION_KEY)
+    return bool(secret) and bool(granted) and hmac.compare_digest(granted, _secret_fingerprint(secret))
+
+def _is_triggered(app):
+    """Check the secret header or query flag"""
+    return check_profile_secret(app, request.headers.get('X-Profile') or request.args.get('__profile'))
+
+def _profile_filename(elapsed_ms):
+    """Build a sortable file name for a profile of the current request"""
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_') or 'index'
+    timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S_%f')
+    return f"{timestamp}_{request.method}_{slug}_{elapsed_ms:.0f}ms{PROFILE_SUFFIX}"
+
+def _rotate(profile_dir, max_files, max_bytes):
+    """Delete the oldest profiles until the directory is under its caps"""
+    profiles = list_profiles(profile_dir)
+    total_bytes = sum(profile['size'] for profile in profiles)
+
+    # list_profiles returns newest first
+    while profiles and (len(profiles) > max_files or total_bytes > max_bytes):
+        oldest = profiles.pop()
+        total_bytes -= oldest['size']
+        try:
+            os.remove(os.path.join(profile_dir, oldest['name']))
+        except OSError as e:
+            logging.error(f"Error removing profile {oldest['name']}: {e}")
+
+def list_profiles(profile_dir):
+    """List stored profiles, newest first"""
+    if not os.path.isdir(profile_dir):
+        return []
+
+    profiles = []
+    for entry in os.scandir(profile_dir):
+        if entry.is_file() and entry.name.endswith(PROFILE_SUFFIX):
+            stat = entry.stat()
+            profiles.append({
+                'name': entry.name,
+                'size': stat.st_size,
+                'created_at': datetime.fromtimestamp(stat.st_mtime)
+            })
+
+    return sorted(profiles, key=lambda profile: profile['name'], reverse=True)
+
+def get_profile_path(profile_dir, name):
+    """Resolve a profile name to a path, rejecting anything outside profile_dir"""
+    if os.path.basename(name) != name or not name.endswith(PROFILE_SUFFIX):
+        return None
+
+    path = os.path.join(profile_dir, name)
+    return path if os.path.isfile(path) else None
+
+def format_profile_stats(path, limit=40):
+    """Render the top functions of a pstats file by cumulative time"""
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
+
+def init_profiler(app):
+    """Register the profiling hooks on the app"""
+    sample_rate = app.config['PROFILE_SAMPLE_RATE']
+
+    @app.before_request
+    def start_profiler():
+        forced = _is_triggered(app)
+        if not forced and not (sample_rate and random.random() < sample_rate):
+            return
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another request on this process is already being profiled
+            return
+
+        g.profiler = profiler
+        g.profile_forced = forced
+        g.profile_started = time.perf_counter()
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return
+
+        profiler.disable()
+        elapsed_ms = (time.perf_counter() - g.profile_started) * 1000
+
+        if not g.profile_forced and elapsed_ms < app.config['PROFILE_SLOW_MS']:
+            return
+
+        profile_dir = app.config['PROFILE_DIR']
+        try:
+            os.makedirs(profile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(profile_dir, _profile_filename(elapsed_ms)))
+            _rotate(profile_dir, app.config['PROFILE_MAX_FILES'], app.config['PROFILE_MAX_BYTES'])
+        except OSError as e:
+            logging.error(f"Error saving profile: {e}")
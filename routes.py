@@ -1,33 +1,39 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify
+from flask import render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, abort, send_file, send_from_directory, session
 from app import app
 from data_service import DataService
-from utils import calculate_bundle_metrics
+from utils import calculate_bundle_metrics, calculate_store_summary, calculate_sales_metrics
+from profiler import (
+    check_profile_secret, format_profile_stats, get_profile_path, grant_profile_session,
+    has_profile_session, list_profiles
+)
+from stores import get_stores
+from labels import label_jobs, stream_labels
+from datetime import datetime
+import csv
+import io
 import logging
+import math
+import os
+
+QUALITIES = ('premium', 'regular', 'economica', 'rechazo')
+MAX_SALES_BATCH = 5000
+MAX_SYNC_BATCH = 200
+MAX_LABEL_BUNDLES = 50
+CHANGES_PREVIEW = 10
 
 @app.route('/')
 def index():
     """Dashboard principal"""
     try:
-        bundles = DataService.get_all_bundles()
+        before = request.args.get('before', type=int)
+        bundles, next_before = DataService.get_bundle_list(before=before)
         config = DataService.get_config()
         
         # Calculate summary statistics
-        total_bundles = len(bundles)
-        total_investment = sum(bundle.get('total_cost', 0) for bundle in bundles)
-        total_estimated_profit = 0
-        
-        for bundle in bundles:
-            metrics = calculate_bundle_metrics(bundle, config)
-            total_estimated_profit += metrics.get('total_estimated_profit', 0)
-        
-        summary = {
-            'total_bundles': total_bundles,
-            'total_investment': total_investment,
-            'total_estimated_profit': total_estimated_profit,
-            'estimated_profit_margin': (total_estimated_profit / total_investment * 100) if total_investment > 0 else 0
-        }
+        summary = calculate_store_summary(DataService.get_store_summary(), config)
         
-        return render_template('index.html', bundles=bundles, summary=summary)
+        return render_template('index.html', bundles=bundles, summary=summary,
+                               next_before=next_before, is_first_page=before is None)
     except Exception as e:
         logging.error(f"Error in index route: {e}")
         flash('Error al cargar los datos', 'error')
@@ -64,64 +70,102 @@ def config():
     config_data = DataService.get_config()
     return render_template('config.html', config=config_data)
 
+@app.route('/stores', methods=['GET', 'POST'])
+def stores():
+    """Administrar tiendas"""
+    if request.method == 'POST':
+        name = request.form.get('name', '').strip()
+        if not name:
+            flash('El nombre de la tienda es requerido', 'error')
+        elif name in get_stores().values():
+            flash('Ya existe una tienda con ese nombre', 'error')
+        else:
+            try:
+                store_id = DataService.create_store(name)
+                session['store_id'] = store_id
+                flash('Tienda creada exitosamente', 'success')
+                return redirect(url_for('index'))
+            except Exception as e:
+                logging.error(f"Error creating store: {e}")
+                flash('Error al crear la tienda', 'error')
+    
+    return render_template('stores.html')
+
+@app.route('/stores/<int:store_id>/select', methods=['POST'])
+def select_store(store_id):
+    """Cambiar la tienda actual"""
+    if store_id in get_stores():
+        session['store_id'] = store_id
+    else:
+        flash('Tienda no encontrada', 'error')
+    
+    return redirect(url_for('index'))
+
+def _parse_bundle_data(source):
+    """Leer los datos de una paca desde un formulario o un diccionario JSON"""
+    return {
+        'name': str(source.get('name', '')).strip(),
+        'total_cost': float(source.get('total_cost', 0)),
+        'total_pieces': int(source.get('total_pieces', 0)),
+        'additional_expenses': {
+            'transport': float(source.get('transport', 0)),
+            'cleaning': float(source.get('cleaning', 0)),
+            'other': float(source.get('other', 0))
+        },
+        'classification': {
+            'by_type': {
+                'hombre': int(source.get('hombre', 0)),
+                'mujer': int(source.get('mujer', 0)),
+                'ninos': int(source.get('ninos', 0)),
+                'hogar': int(source.get('hogar', 0))
+            },
+            'by_quality': {
+                'premium': int(source.get('premium', 0)),
+                'regular': int(source.get('regular', 0)),
+                'economica': int(source.get('economica', 0)),
+                'rechazo': int(source.get('rechazo', 0))
+            }
+        }
+    }
+
+def _validate_bundle_data(bundle_data):
+    """Validar los datos de una paca; devuelve el mensaje de error o None"""
+    if not bundle_data['name']:
+        return 'El nombre de la paca es requerido'
+    
+    if bundle_data['total_cost'] <= 0:
+        return 'El costo total debe ser mayor a 0'
+    
+    if bundle_data['total_pieces'] <= 0:
+        return 'El número de piezas debe ser mayor a 0'
+    
+    # Validate classification totals
+    total_by_type = sum(bundle_data['classification']['by_type'].values())
+    total_by_quality = sum(bundle_data['classification']['by_quality'].values())
+    
+    if total_by_type != bundle_data['total_pieces']:
+        return f'La suma de piezas por tipo ({total_by_type}) debe ser igual al total de piezas ({bundle_data["total_pieces"]})'
+    
+    if total_by_quality != bundle_data['total_pieces']:
+        return f'La suma de piezas por calidad ({total_by_quality}) debe ser igual al total de piezas ({bundle_data["total_pieces"]})'
+    
+    return None
+
 @app.route('/new_bundle', methods=['GET', 'POST'])
 def new_bundle():
     """Crear nueva paca"""
     if request.method == 'POST':
         try:
-            # Get basic bundle data
-            bundle_data = {
-                'name': request.form.get('name', '').strip(),
-                'total_cost': float(request.form.get('total_cost', 0)),
-                'total_pieces': int(request.form.get('total_pieces', 0)),
-                'additional_expenses': {
-                    'transport': float(request.form.get('transport', 0)),
-                    'cleaning': float(request.form.get('cleaning', 0)),
-                    'other': float(request.form.get('other', 0))
-                },
-                'classification': {
-                    'by_type': {
-                        'hombre': int(request.form.get('hombre', 0)),
-                        'mujer': int(request.form.get('mujer', 0)),
-                        'ninos': int(request.form.get('ninos', 0)),
-                        'hogar': int(request.form.get('hogar', 0))
-                    },
-                    'by_quality': {
-                        'premium': int(request.form.get('premium', 0)),
-                        'regular': int(request.form.get('regular', 0)),
-                        'economica': int(request.form.get('economica', 0)),
-                        'rechazo': int(request.form.get('rechazo', 0))
-                    }
-                }
-            }
+            bundle_data = _parse_bundle_data(request.form)
             
             # Validate data
-            if not bundle_data['name']:
-                flash('El nombre de la paca es requerido', 'error')
-                return render_template('new_bundle.html')
-            
-            if bundle_data['total_cost'] <= 0:
-                flash('El costo total debe ser mayor a 0', 'error')
-                return render_template('new_bundle.html')
-            
-            if bundle_data['total_pieces'] <= 0:
-                flash('El número de piezas debe ser mayor a 0', 'error')
-                return render_template('new_bundle.html')
-            
-            # Validate classification totals
-            total_by_type = sum(bundle_data['classification']['by_type'].values())
-            total_by_quality = sum(bundle_data['classification']['by_quality'].values())
-            
-            if total_by_type != bundle_data['total_pieces']:
-                flash(f'La suma de piezas por tipo ({total_by_type}) debe ser igual al total de piezas ({bundle_data["total_pieces"]})', 'error')
-                return render_template('new_bundle.html')
-            
-            if total_by_quality != bundle_data['total_pieces']:
-                flash(f'La suma de piezas por calidad ({total_by_quality}) debe ser igual al total de piezas ({bundle_data["total_pieces"]})', 'error')
+            error = _validate_bundle_data(bundle_data)
+            if error:
+                flash(error, 'error')
                 return render_template('new_bundle.html')
             
             # Save bundle
-            bundle_id = DataService.save_bundle(bundle_data)
+            bundle_id = DataService.save_bundle(bundle_data, client_key=request.form.get('client_key'))
             flash('Paca creada exitosamente', 'success')
             return redirect(url_for('bundle_details', bundle_id=bundle_id))
             
@@ -148,13 +192,81 @@ def bundle_details(bundle_id):
         
         config = DataService.get_config()
         metrics = calculate_bundle_metrics(bundle, config)
+        sales = calculate_sales_metrics(metrics, DataService.get_sales_summary(bundle_id))
+        changes, changes_next = DataService.get_bundle_history(bundle_id, limit=CHANGES_PREVIEW)
         
-        return render_template('bundle_details.html', bundle=bundle, metrics=metrics)
+        return render_template('bundle_details.html', bundle=bundle, metrics=metrics, sales=sales,
+                               changes=changes, changes_next=changes_next)
     except Exception as e:
         logging.error(f"Error loading bundle details: {e}")
         flash('Error al cargar los detalles de la paca', 'error')
         return redirect(url_for('index'))
 
+@app.route('/bundle/<int:bundle_id>/changes')
+def bundle_changes(bundle_id):
+    """Historial de cambios de una paca, paginado del más reciente al más antiguo"""
+    before = request.args.get('before', type=int)
+    changes, next_before = DataService.get_bundle_history(bundle_id, before=before)
+    
+    # Deleted bundles keep their history, so fall back to the name in the delete snapshot
+    back_url = None
+    bundle = DataService.get_bundle(bundle_id)
+    if bundle:
+        back_url = url_for('bundle_details', bundle_id=bundle_id)
+    else:
+        bundle = DataService.get_archived_bundle(bundle_id)
+        if bundle:
+            back_url = url_for('archived_bundle_details', bundle_id=bundle_id)
+    
+    if bundle:
+        name = bundle['name']
+    else:
+        deleted = next((c for c in changes if c.action == 'delete' and c.field is None and c.old_value), None)
+        name = deleted.old_value['name'] if deleted else f'Paca {bundle_id}'
+    
+    return render_template('bundle_changes.html', bundle_id=bundle_id, name=name, back_url=back_url,
+                           changes=changes, next_before=next_before, is_first_page=before is None)
+
+def _labels_response(bundles, filename):
+    """Transmitir las etiquetas ZPL de varias pacas conforme se generan"""
+    config = DataService.get_config()
+    jobs = []
+    for bundle in bundles:
+        jobs.extend(label_jobs(bundle, calculate_bundle_metrics(bundle, config)))
+    
+    return Response(
+        stream_labels(jobs),
+        mimetype='application/zpl',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@app.route('/bundle/<int:bundle_id>/labels.zpl')
+def bundle_labels(bundle_id):
+    """Etiquetas de precio para cada pieza de una paca"""
+    bundle = DataService.get_bundle(bundle_id)
+    if not bundle:
+        flash('Paca no encontrada', 'error')
+        return redirect(url_for('index'))
+    
+    return _labels_response([bundle], f'etiquetas_paca_{bundle_id}.zpl')
+
+@app.route('/labels.zpl')
+def batch_labels():
+    """Etiquetas de precio para un lote de pacas (?bundle_id=1&bundle_id=2...)"""
+    bundle_ids = list(dict.fromkeys(request.args.getlist('bundle_id', type=int)))
+    if not bundle_ids:
+        return jsonify({'error': 'Se requiere al menos un bundle_id'}), 400
+    
+    if len(bundle_ids) > MAX_LABEL_BUNDLES:
+        return jsonify({'error': f'Máximo {MAX_LABEL_BUNDLES} pacas por lote'}), 400
+    
+    bundles = DataService.get_bundles(bundle_ids)
+    missing = set(bundle_ids) - {bundle['id'] for bundle in bundles}
+    if missing:
+        return jsonify({'error': 'Pacas no encontradas', 'bundle_ids': sorted(missing)}), 404
+    
+    return _labels_response(bundles, 'etiquetas_lote.zpl')
+
 @app.route('/delete_bundle/<int:bundle_id>', methods=['POST'])
 def delete_bundle(bundle_id):
     """Eliminar una paca"""
@@ -179,55 +291,12 @@ def edit_bundle(bundle_id):
     
     if request.method == 'POST':
         try:
-            # Get updated bundle data
-            bundle_data = {
-                'name': request.form.get('name', '').strip(),
-                'total_cost': float(request.form.get('total_cost', 0)),
-                'total_pieces': int(request.form.get('total_pieces', 0)),
-                'additional_expenses': {
-                    'transport': float(request.form.get('transport', 0)),
-                    'cleaning': float(request.form.get('cleaning', 0)),
-                    'other': float(request.form.get('other', 0))
-                },
-                'classification': {
-                    'by_type': {
-                        'hombre': int(request.form.get('hombre', 0)),
-                        'mujer': int(request.form.get('mujer', 0)),
-                        'ninos': int(request.form.get('ninos', 0)),
-                        'hogar': int(request.form.get('hogar', 0))
-                    },
-                    'by_quality': {
-                        'premium': int(request.form.get('premium', 0)),
-                        'regular': int(request.form.get('regular', 0)),
-                        'economica': int(request.form.get('economica', 0)),
-                        'rechazo': int(request.form.get('rechazo', 0))
-                    }
-                }
-            }
+            bundle_data = _parse_bundle_data(request.form)
             
             # Validate data
-            if not bundle_data['name']:
-                flash('El nombre de la paca es requerido', 'error')
-                return render_template('edit_bundle.html', bundle=bundle)
-            
-            if bundle_data['total_cost'] <= 0:
-                flash('El costo total debe ser mayor a 0', 'error')
-                return render_template('edit_bundle.html', bundle=bundle)
-            
-            if bundle_data['total_pieces'] <= 0:
-                flash('El número de piezas debe ser mayor a 0', 'error')
-                return render_template('edit_bundle.html', bundle=bundle)
-            
-            # Validate classification totals
-            total_by_type = sum(bundle_data['classification']['by_type'].values())
-            total_by_quality = sum(bundle_data['classification']['by_quality'].values())
-            
-            if total_by_type != bundle_data['total_pieces']:
-                flash(f'La suma de piezas por tipo ({total_by_type}) debe ser igual al total de piezas ({bundle_data["total_pieces"]})', 'error')
-                return render_template('edit_bundle.html', bundle=bundle)
-            
-            if total_by_quality != bundle_data['total_pieces']:
-                flash(f'La suma de piezas por calidad ({total_by_quality}) debe ser igual al total de piezas ({bundle_data["total_pieces"]})', 'error')
+            error = _validate_bundle_data(bundle_data)
+            if error:
+                flash(error, 'error')
                 return render_template('edit_bundle.html', bundle=bundle)
             
             # Update bundle
@@ -244,3 +313,234 @@ def edit_bundle(bundle_id):
             flash('Error al actualizar la paca', 'error')
     
     return render_template('edit_bundle.html', bundle=bundle)
+
+def _parse_sale(event):
+    """Validar y normalizar un evento de venta"""
+    if not isinstance(event, dict):
+        raise ValueError("Cada venta debe ser un objeto")
+    
+    quality = event.get('quality')
+    if quality not in QUALITIES:
+        raise ValueError(f"Calidad inválida: {quality}")
+    
+    sale = {
+        'bundle_id': int(event['bundle_id']),
+        'quality': quality,
+        'quantity': int(event.get('quantity', 1)),
+        'unit_price': float(event['unit_price']),
+        'sold_at': datetime.fromisoformat(event['sold_at']) if event.get('sold_at') else None
+    }
+    
+    if sale['quantity'] <= 0:
+        raise ValueError("La cantidad debe ser mayor a 0")
+    if not math.isfinite(sale['unit_price']):
+        raise ValueError("El precio debe ser un número finito")
+    if sale['unit_price'] < 0:
+        raise ValueError("El precio no puede ser negativo")
+    
+    return sale
+
+@app.route('/api/sales', methods=['POST'])
+def record_sales():
+    """Registrar un lote de ventas de piezas"""
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Se requiere un objeto JSON'}), 400
+    events = payload.get('sales')
+    
+    if not isinstance(events, list) or not events:
+        return jsonify({'error': 'Se requiere una lista de ventas'}), 400
+    
+    if len(events) > MAX_SALES_BATCH:
+        return jsonify({'error': f'Máximo {MAX_SALES_BATCH} ventas por lote'}), 400
+    
+    try:
+        sales = [_parse_sale(event) for event in events]
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        return jsonify({'error': f'Venta inválida: {e}'}), 400
+    
+    missing = DataService.get_missing_bundle_ids(sale['bundle_id'] for sale in sales)
+    if missing:
+        return jsonify({'error': 'Pacas no encontradas', 'bundle_ids': sorted(missing)}), 404
+    
+    try:
+        recorded, oversold = DataService.record_sales(sales)
+    except Exception as e:
+        logging.error(f"Error recording sales: {e}")
+        return jsonify({'error': 'Error al registrar las ventas'}), 500
+    
+    if oversold:
+        return jsonify({'error': 'Las ventas exceden las piezas de la paca', 'oversold': oversold}), 409
+    
+    return jsonify({'recorded': recorded}), 201
+
+def _parse_sync_operation(operation):
+    """Validar y normalizar una operación de sincronización sin conexión"""
+    if not isinstance(operation, dict):
+        raise ValueError("Cada operación debe ser un objeto")
+    
+    client_key = str(operation.get('client_key', '')).strip()
+    if not client_key or len(client_key) > 64:
+        raise ValueError("client_key inválido")
+    
+    action = operation.get('action', 'create')
+    if action not in ('create', 'update'):
+        raise ValueError(f"Acción inválida: {action}")
+    
+    bundle_data = _parse_bundle_data(operation.get('bundle') or {})
+    error = _validate_bundle_data(bundle_data)
+    if error:
+        raise ValueError(error)
+    
+    return {
+        'client_key': client_key,
+        'action': action,
+        'bundle_id': int(operation['bundle_id']) if action == 'update' else None,
+        'bundle_data': bundle_data
+    }
+
+@app.route('/api/bundles/sync', methods=['POST'])
+def sync_bundles():
+    """Sincronizar en un solo lote las pacas capturadas sin conexión"""
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Se requiere un objeto JSON'}), 400
+    operations = payload.get('operations')
+    
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'Se requiere una lista de operaciones'}), 400
+    
+    if len(operations) > MAX_SYNC_BATCH:
+        return jsonify({'error': f'Máximo {MAX_SYNC_BATCH} operaciones por lote'}), 400
+    
+    valid = []
+    results = {}
+    for index, operation in enumerate(operations):
+        try:
+            valid.append((index, _parse_sync_operation(operation)))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            client_key = operation.get('client_key') if isinstance(operation, dict) else None
+            results[index] = {'client_key': client_key, 'status': 'invalid', 'error': str(e)}
+    
+    if valid:
+        try:
+            synced = DataService.sync_bundles([operation for _, operation in valid])
+        except Exception as e:
+            logging.error(f"Error syncing bundles: {e}")
+            return jsonify({'error': 'Error al sincronizar las pacas'}), 500
+        
+        for (index, _), result in zip(valid, synced):
+            results[index] = result
+    
+    return jsonify({'results': [results[index] for index in range(len(operations))]})
+
+@app.route('/sw.js')
+def service_worker():
+    """Service worker servido desde la raíz para controlar toda la aplicación"""
+    response = send_from_directory(os.path.join(app.static_folder, 'js'), 'sw.js', mimetype='application/javascript')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/history')
+def history():
+    """Historial de pacas archivadas"""
+    before = request.args.get('before', type=int)
+    bundles, next_before = DataService.get_archived_bundles(before=before)
+    return render_template('history.html', bundles=bundles, next_before=next_before, is_first_page=before is None)
+
+@app.route('/history/<int:bundle_id>')
+def archived_bundle_details(bundle_id):
+    """Detalles de una paca archivada"""
+    try:
+        bundle = DataService.get_archived_bundle(bundle_id)
+        if not bundle:
+            flash('Paca no encontrada en el historial', 'error')
+            return redirect(url_for('history'))
+        
+        config = DataService.get_config()
+        metrics = calculate_bundle_metrics(bundle, config)
+        sales = calculate_sales_metrics(metrics, DataService.get_sales_summary(bundle_id))
+        changes, changes_next = DataService.get_bundle_history(bundle_id, limit=CHANGES_PREVIEW)
+        
+        return render_template('bundle_details.html', bundle=bundle, metrics=metrics, sales=sales, archived=True,
+                               changes=changes, changes_next=changes_next)
+    except Exception as e:
+        logging.error(f"Error loading archived bundle details: {e}")
+        flash('Error al cargar los detalles de la paca', 'error')
+        return redirect(url_for('history'))
+
+@app.route('/history/export.csv')
+def export_history():
+    """Exportar el historial de pacas archivadas como CSV"""
+    header = ['id', 'name', 'total_cost', 'total_pieces', 'additional_expenses',
+              'premium', 'regular', 'economica', 'rechazo', 'created_at', 'archived_at']
+    
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        
+        for bundle in DataService.iter_archived_bundles():
+            writer.writerow([
+                bundle.id,
+                bundle.name,
+                bundle.total_cost,
+                bundle.total_pieces,
+                bundle.total_additional_expenses,
+                *(bundle.by_quality.get(quality, 0) for quality in QUALITIES),
+                bundle.created_at.isoformat() if bundle.created_at else '',
+                bundle.archived_at.isoformat() if bundle.archived_at else ''
+            ])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        
+        yield buffer.getvalue()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=historial_pacas.csv'}
+    )
+
+def _require_profile_secret():
+    """Ocultar las páginas de perfiles salvo con PROFILE_SECRET o una sesión ya verificada.
+    
+    Devuelve una redirección cuando el secreto llegó en la URL, para quitarlo
+    del historial del navegador; si no, None.
+    """
+    if has_profile_session(app):
+        return None
+    
+    key = request.headers.get('X-Profile') or request.args.get('key')
+    if not check_profile_secret(app, key):
+        abort(404)
+    
+    grant_profile_session(app)
+    if 'key' in request.args:
+        args = {name: value for name, value in request.args.items() if name != 'key'}
+        return redirect(url_for(request.endpoint, **request.view_args, **args))
+    return None
+
+@app.route('/admin/profiles')
+def profiles():
+    """Perfiles de solicitudes recientes"""
+    response = _require_profile_secret()
+    if response:
+        return response
+    return render_template('profiles.html', profiles=list_profiles(app.config['PROFILE_DIR']))
+
+@app.route('/admin/profiles/<name>')
+def profile_details(name):
+    """Ver o descargar un perfil"""
+    response = _require_profile_secret()
+    if response:
+        return response
+    path = get_profile_path(app.config['PROFILE_DIR'], name)
+    if not path:
+        abort(404)
+    
+    if request.args.get('download'):
+        return send_file(os.path.abspath(path), as_attachment=True, download_name=name)
+    
+    return render_template('profile_details.html', name=name, stats=format_profile_stats(path))
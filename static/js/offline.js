@@ -0,0 +1,134 @@
+// Offline intake: queue bundle forms locally and sync them in one batch
+
+const BATCH_MODE_KEY = 'pacas-batch-mode';
+
+document.addEventListener('DOMContentLoaded', function() {
+    if (!('indexedDB' in window) || !window.PacasSync) return;
+
+    registerServiceWorker();
+    initializeOfflineForms();
+    initializeBatchControls();
+
+    window.addEventListener('online', syncQueue);
+    if (navigator.onLine) {
+        syncQueue();
+    } else {
+        updatePendingCount();
+    }
+});
+
+function registerServiceWorker() {
+    if ('serviceWorker' in navigator) {
+        navigator.serviceWorker.register('/sw.js').catch(error => {
+            console.error('Service worker registration failed:', error);
+        });
+    }
+}
+
+function isBatchMode() {
+    return localStorage.getItem(BATCH_MODE_KEY) === '1';
+}
+
+function initializeOfflineForms() {
+    const form = document.getElementById('bundleForm') || document.getElementById('editBundleForm');
+    if (!form) return;
+
+    const isEdit = form.id === 'editBundleForm';
+
+    // Online submissions carry a client key too, so a resubmitted form never duplicates
+    const keyInput = form.querySelector('input[name="client_key"]');
+    if (keyInput && !keyInput.value) {
+        keyInput.value = crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random()}`;
+    }
+
+    form.addEventListener('submit', function(e) {
+        // Validation in main.js already rejected the form
+        if (e.defaultPrevented) return;
+        if (navigator.onLine && (isEdit || !isBatchMode())) return;
+
+        e.preventDefault();
+
+        const fields = Object.fromEntries(new FormData(form));
+        const clientKey = fields.client_key;
+        delete fields.client_key;
+
+        PacasSync.enqueue({
+            client_key: isEdit ? undefined : clientKey,
+            action: isEdit ? 'update' : 'create',
+            bundle_id: isEdit ? parseInt(form.dataset.bundleId) : undefined,
+            store_id: document.body.dataset.storeId,
+            bundle: fields
+        }).then(() => {
+            window.PacasApp.setFormLoading(form, false);
+            window.PacasApp.showAlert(`"${fields.name}" guardada en este dispositivo. Se sincronizará al haber conexión.`, 'success');
+
+            if (!isEdit) {
+                form.reset();
+                form.classList.remove('was-validated');
+                if (keyInput) {
+                    keyInput.value = crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random()}`;
+                }
+            }
+
+            requestBackgroundSync();
+            updatePendingCount();
+        }).catch(error => {
+            console.error('Error queueing bundle:', error);
+            window.PacasApp.showAlert('No se pudo guardar la paca en este dispositivo', 'danger');
+        });
+    });
+}
+
+function initializeBatchControls() {
+    const toggle = document.getElementById('batchMode');
+    if (toggle) {
+        toggle.checked = isBatchMode();
+        toggle.addEventListener('change', function() {
+            localStorage.setItem(BATCH_MODE_KEY, toggle.checked ? '1' : '0');
+        });
+    }
+
+    const syncButton = document.getElementById('syncNow');
+    if (syncButton) {
+        syncButton.addEventListener('click', syncQueue);
+    }
+}
+
+function requestBackgroundSync() {
+    if ('serviceWorker' in navigator && 'SyncManager' in window) {
+        navigator.serviceWorker.ready
+            .then(registration => registration.sync.register('pacas-sync'))
+            .catch(() => {});
+    }
+}
+
+function syncQueue() {
+    if (!navigator.onLine) {
+        updatePendingCount();
+        return;
+    }
+
+    PacasSync.flush().then(results => {
+        const synced = results.filter(result => ['created', 'duplicate', 'updated'].includes(result.status));
+        const failed = results.length - synced.length;
+
+        if (synced.length) {
+            window.PacasApp.showAlert(`${synced.length} paca(s) sincronizada(s)`, 'success');
+        }
+        if (failed) {
+            window.PacasApp.showAlert(`${failed} paca(s) no se pudieron sincronizar`, 'danger');
+        }
+    }).catch(error => {
+        console.error('Error syncing bundles:', error);
+    }).finally(updatePendingCount);
+}
+
+function updatePendingCount() {
+    PacasSync.getAll().then(entries => {
+        const pending = entries.filter(entry => !entry.error).length;
+        document.querySelectorAll('.pending-sync-count').forEach(badge => {
+            badge.textContent = pending;
+            badge.closest('.pending-sync').classList.toggle('d-none', entries.length === 0);
+        });
+    });
+}
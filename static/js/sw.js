@@ -0,0 +1,74 @@
+// Service worker: caches the app shell and replays queued offline intake
+
+importScripts('/static/js/sync-queue.js');
+
+const CACHE_NAME = 'pacas-shell-v2';
+const SHELL_URLS = [
+    '/',
+    '/new_bundle',
+    '/static/css/style.css',
+    '/static/js/main.js',
+    '/static/js/offline.js',
+    '/static/js/sync-queue.js',
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/bootstrap-icons.css',
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js'
+];
+const UNCACHED_PREFIXES = ['/api/', '/admin/', '/history/export'];
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(CACHE_NAME)
+            .then(cache => cache.addAll(SHELL_URLS))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(keys.filter(key => key !== CACHE_NAME).map(key => caches.delete(key))))
+            .then(() => self.clients.claim())
+    );
+});
+
+function putInCache(request, response) {
+    if (response && (response.ok || response.type === 'opaque')) {
+        const copy = response.clone();
+        caches.open(CACHE_NAME).then(cache => cache.put(request, copy));
+    }
+    return response;
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+
+    const url = new URL(request.url);
+    if (url.origin === self.location.origin && UNCACHED_PREFIXES.some(prefix => url.pathname.startsWith(prefix))) {
+        return;
+    }
+
+    if (request.mode === 'navigate') {
+        // Pages: always try the network first so data is fresh
+        event.respondWith(
+            fetch(request)
+                .then(response => putInCache(request, response))
+                .catch(() => caches.match(request).then(cached => cached || caches.match('/new_bundle')))
+        );
+        return;
+    }
+
+    // Static assets: cache first
+    event.respondWith(
+        caches.match(request).then(cached => cached || fetch(request).then(response => putInCache(request, response)))
+    );
+});
+
+self.addEventListener('sync', event => {
+    if (event.tag === 'pacas-sync') {
+        event.waitUntil(self.PacasSync.flush());
+    }
+});
@@ -0,0 +1,156 @@
+// Offline intake queue shared by the pages and the service worker
+
+(function(scope) {
+    const DB_NAME = 'pacas-offline';
+    const STORE_NAME = 'operations';
+    const SYNC_URL = '/api/bundles/sync';
+    const MAX_BATCH = 200;
+    const DONE_STATUSES = ['created', 'duplicate', 'updated'];
+
+    let flushing = null;
+
+    function createQueueStore(db) {
+        // Auto-increment keys keep capture order; getAll() returns records in key order
+        const store = db.createObjectStore(STORE_NAME, { keyPath: 'seq', autoIncrement: true });
+        store.createIndex('client_key', 'client_key', { unique: true });
+        return store;
+    }
+
+    function openDatabase() {
+        return new Promise((resolve, reject) => {
+            const request = indexedDB.open(DB_NAME, 2);
+            request.onupgradeneeded = event => {
+                const db = request.result;
+                if (event.oldVersion < 1) {
+                    createQueueStore(db);
+                    return;
+                }
+                if (event.oldVersion < 2) {
+                    // Version 1 was keyed by client_key (random order): requeue by capture time
+                    const oldStore = request.transaction.objectStore(STORE_NAME);
+                    const pending = oldStore.getAll();
+                    pending.onsuccess = () => {
+                        db.deleteObjectStore(STORE_NAME);
+                        const store = createQueueStore(db);
+                        pending.result
+                            .sort((a, b) => (a.queued_at || '').localeCompare(b.queued_at || ''))
+                            .forEach(entry => store.add(entry));
+                    };
+                }
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    function withStore(mode, callback) {
+        return openDatabase().then(db => new Promise((resolve, reject) => {
+            const transaction = db.transaction(STORE_NAME, mode);
+            const result = callback(transaction.objectStore(STORE_NAME));
+            transaction.oncomplete = () => resolve(result && 'result' in result ? result.result : undefined);
+            transaction.onerror = () => reject(transaction.error);
+        }));
+    }
+
+    function generateKey() {
+        if (scope.crypto && scope.crypto.randomUUID) {
+            return scope.crypto.randomUUID();
+        }
+        return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    }
+
+    function enqueue(operation) {
+        const entry = Object.assign({ queued_at: new Date().toISOString() }, operation);
+        if (!entry.client_key) {
+            entry.client_key = generateKey();
+        }
+        return withStore('readwrite', store => {
+            // Requeueing a client key replaces the entry in place, keeping its position
+            const existing = store.index('client_key').getKey(entry.client_key);
+            existing.onsuccess = () => {
+                if (existing.result !== undefined) {
+                    entry.seq = existing.result;
+                }
+                store.put(entry);
+            };
+        }).then(() => entry);
+    }
+
+    function getAll() {
+        return withStore('readonly', store => store.getAll());
+    }
+
+    function getPending() {
+        return getAll().then(entries => entries.filter(entry => !entry.error));
+    }
+
+    function applyResults(results) {
+        return withStore('readwrite', store => {
+            results.forEach(result => {
+                const request = store.index('client_key').openCursor(IDBKeyRange.only(result.client_key || ''));
+                request.onsuccess = () => {
+                    const cursor = request.result;
+                    if (!cursor) return;
+                    if (DONE_STATUSES.includes(result.status)) {
+                        cursor.delete();
+                        return;
+                    }
+                    // Keep rejected entries so the user can see why, but stop retrying them
+                    cursor.value.error = result.error || result.status;
+                    cursor.update(cursor.value);
+                };
+            });
+        });
+    }
+
+    function sendBatch(storeId, entries) {
+        return fetch(SYNC_URL, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: { 'Content-Type': 'application/json', 'X-Store': String(storeId) },
+            body: JSON.stringify({
+                operations: entries.map(entry => ({
+                    client_key: entry.client_key,
+                    action: entry.action,
+                    bundle_id: entry.bundle_id,
+                    bundle: entry.bundle
+                }))
+            })
+        }).then(response => {
+            if (!response.ok) {
+                throw new Error(`Sync failed with status ${response.status}`);
+            }
+            return response.json();
+        }).then(payload => applyResults(payload.results).then(() => payload.results));
+    }
+
+    // Send every pending operation in capture order, one request per store and batch
+    function flush() {
+        if (flushing) {
+            return flushing;
+        }
+
+        flushing = getPending().then(entries => {
+            const byStore = {};
+            entries.forEach(entry => {
+                (byStore[entry.store_id] = byStore[entry.store_id] || []).push(entry);
+            });
+
+            let chain = Promise.resolve([]);
+            Object.keys(byStore).forEach(storeId => {
+                const storeEntries = byStore[storeId];
+                for (let i = 0; i < storeEntries.length; i += MAX_BATCH) {
+                    const batch = storeEntries.slice(i, i + MAX_BATCH);
+                    chain = chain.then(done => sendBatch(storeId, batch).then(results => done.concat(results)));
+                }
+            });
+            return chain;
+        }).finally(() => {
+            flushing = null;
+        });
+
+        return flushing;
+    }
+
+    scope.PacasSync = { enqueue, getAll, getPending, flush };
+})(self);
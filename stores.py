@@ -0,0 +1,83 @@
+"""
+Current-store resolution.
+
+Every request works against one store, chosen by the X-Store header (API
+clients) or the store saved in the session (browser). An unknown X-Store is
+rejected rather than redirected to another store; without either, and outside
+a request (e.g. in maintenance scripts), the default store is used.
+"""
+import logging
+import time
+from flask import g, has_request_context, jsonify, request, session
+from models import DEFAULT_STORE_ID, Store
+
+# Seconds a process keeps the store list before reloading it
+STORES_CACHE_TTL = 60
+
+_stores_cache = {'expires': 0, 'stores': {}}
+
+
+def get_stores():
+    """Get all stores as {id: name}, cached for STORES_CACHE_TTL seconds"""
+    if time.monotonic() >= _stores_cache['expires']:
+        try:
+            stores = Store.query.order_by(Store.id).all()
+            _stores_cache['stores'] = {store.id: store.name for store in stores}
+            _stores_cache['expires'] = time.monotonic() + STORES_CACHE_TTL
+        except Exception as e:
+            logging.error(f"Error loading stores: {e}")
+    return _stores_cache['stores']
+
+def invalidate_stores():
+    """Force the next get_stores() call to reload from the database"""
+    _stores_cache['expires'] = 0
+
+def _store_exists(store_id):
+    """Check the cached store list, reloading it once on a miss.
+
+    Stores created by another process only reach this one's cache on reload.
+    """
+    if store_id in get_stores():
+        return True
+    invalidate_stores()
+    return store_id in get_stores()
+
+def current_store_id():
+    """Get the store the current request works against"""
+    if has_request_context() and 'store_id' in g:
+        return g.store_id
+    return DEFAULT_STORE_ID
+
+def init_stores(app):
+    """Register the store resolution hooks on the app"""
+
+    @app.before_request
+    def resolve_store():
+        requested = request.headers.get('X-Store')
+        if requested:
+            # Never write an API client's data into a store it did not ask for
+            try:
+                store_id = int(requested)
+            except ValueError:
+                return jsonify({'error': 'X-Store inválido'}), 400
+            if not _store_exists(store_id):
+                return jsonify({'error': 'Tienda no encontrada', 'store_id': store_id}), 404
+            g.store_id = store_id
+            return None
+
+        store_id = session.get('store_id')
+        if store_id is not None and not _store_exists(store_id):
+            # The session outlived its store; go back to the default one
+            session.pop('store_id')
+            store_id = None
+        g.store_id = store_id if store_id is not None else DEFAULT_STORE_ID
+        return None
+
+    @app.context_processor
+    def inject_stores():
+        store_id = current_store_id()
+        return {
+            'stores': get_stores(),
+            'current_store_id': store_id,
+            'current_store_name': get_stores().get(store_id, '')
+        }
@@ -1,3 +1,22 @@
+DEFAULT_PROFIT_PERCENTAGES = {
+    'premium': 80,
+    'regular': 50,
+    'economica': 30,
+    'rechazo': 0
+}
+
+def get_profit_percentages(config):
+    """Obtener los porcentajes de ganancia por calidad de la configuración"""
+    return config.get('profit_percentages', DEFAULT_PROFIT_PERCENTAGES)
+
+def calculate_cost_per_piece(total_cost, total_additional_expenses, total_pieces):
+    """Costo por pieza incluyendo gastos adicionales"""
+    return (total_cost + total_additional_expenses) / total_pieces if total_pieces > 0 else 0
+
+def calculate_ideal_price(cost, profit_percentage):
+    """Precio ideal: costo más el margen de ganancia de la calidad"""
+    return cost * (1 + profit_percentage / 100)
+
 def calculate_bundle_metrics(bundle, config):
     """Calcular métricas y precios de una paca"""
     total_cost = bundle.get('total_cost', 0)
@@ -10,15 +29,10 @@ def calculate_bundle_metrics(bundle, config):
     
     # Calculate cost per piece
     total_cost_with_expenses = total_cost + total_additional_expenses
-    cost_per_piece = total_cost_with_expenses / total_pieces if total_pieces > 0 else 0
+    cost_per_piece = calculate_cost_per_piece(total_cost, total_additional_expenses, total_pieces)
     
     # Get profit percentages from config
-    profit_percentages = config.get('profit_percentages', {
-        'premium': 80,
-        'regular': 50,
-        'economica': 30,
-        'rechazo': 0
-    })
+    profit_percentages = get_profit_percentages(config)
     
     # Calculate prices by quality
     quality_breakdown = []
@@ -35,7 +49,7 @@ def calculate_bundle_metrics(bundle, config):
             minimum_price = cost_per_piece
             
             # Ideal price (with profit margin)
-            ideal_price = cost_per_piece * (1 + profit_percentage / 100)
+            ideal_price = calculate_ideal_price(cost_per_piece, profit_percentage)
             
             # Total revenues
             minimum_revenue = minimum_price * pieces
@@ -78,6 +92,65 @@ def calculate_bundle_metrics(bundle, config):
         'ideal_profit_margin': ideal_profit_margin
     }
 
+def calculate_store_summary(rollup, config):
+    """Calcular el resumen del dashboard a partir de los totales acumulados de la tienda"""
+    profit_percentages = get_profit_percentages(config)
+    
+    # Ideal revenue is linear in pieces, so per-quality cost bases can be priced directly
+    total_ideal_revenue = sum(
+        calculate_ideal_price(getattr(rollup, f'{quality}_basis'), profit_percentages.get(quality, 0))
+        for quality in DEFAULT_PROFIT_PERCENTAGES
+    )
+    total_investment = rollup.total_cost
+    total_estimated_profit = total_ideal_revenue - (rollup.total_cost + rollup.total_additional_expenses)
+    
+    return {
+        'total_bundles': rollup.bundle_count,
+        'total_investment': total_investment,
+        'total_estimated_profit': total_estimated_profit,
+        'estimated_profit_margin': (total_estimated_profit / total_investment * 100) if total_investment > 0 else 0
+    }
+
+def calculate_sales_metrics(metrics, sales_summary):
+    """Comparar ventas realizadas contra los ingresos ideales de una paca"""
+    sold_by_quality = sales_summary.get('by_quality', {})
+    
+    quality_sales = []
+    total_pieces = 0
+    
+    for item in metrics.get('quality_breakdown', []):
+        sold = sold_by_quality.get(item['quality'], {})
+        pieces_sold = sold.get('pieces_sold', 0)
+        realized_revenue = sold.get('revenue', 0)
+        
+        # Ideal revenue for the pieces actually sold
+        ideal_sold_revenue = item['ideal_price'] * pieces_sold
+        
+        total_pieces += item['pieces']
+        
+        quality_sales.append({
+            'quality': item['quality'],
+            'pieces': item['pieces'],
+            'pieces_sold': pieces_sold,
+            'sell_through': (pieces_sold / item['pieces'] * 100) if item['pieces'] > 0 else 0,
+            'realized_revenue': realized_revenue,
+            'ideal_revenue': item['ideal_revenue'],
+            'realized_vs_ideal': (realized_revenue / ideal_sold_revenue * 100) if ideal_sold_revenue > 0 else 0
+        })
+    
+    pieces_sold = sales_summary.get('pieces_sold', 0)
+    realized_revenue = sales_summary.get('revenue', 0)
+    total_ideal_revenue = metrics.get('total_ideal_revenue', 0)
+    
+    return {
+        'quality_sales': quality_sales,
+        'pieces_sold': pieces_sold,
+        'realized_revenue': realized_revenue,
+        'sell_through': (pieces_sold / total_pieces * 100) if total_pieces > 0 else 0,
+        'revenue_progress': (realized_revenue / total_ideal_revenue * 100) if total_ideal_revenue > 0 else 0,
+        'realized_profit': realized_revenue - metrics.get('total_cost_with_expenses', 0)
+    }
+
 def format_currency(amount):
     """Formatear cantidad como moneda con separadores de miles"""
     return f"${amount:,.2f}"